@@ -0,0 +1,70 @@
+"""
+EXPLAIN the metric proximity queries and check that they use the
+projected functional GiST indexes instead of scanning every road.
+
+    python -m bench.check_spatial_indexes [--analyze] [--create]
+
+Exits non-zero when a query does not touch its expected index.
+"""
+import argparse
+import json
+import sys
+
+from spatial.postgis_client import pg_connection
+from spatial.schema import ensure_projected_indexes, projected_index_name
+from spatial.spatial_analyzer import JUNCTION_SNAP_M, PROXIMITY_SQL, ROAD_JUNCTION_SQL
+
+CHECKS = [
+    ("road/hospital proximity", PROXIMITY_SQL, (200,), "planet_osm_roads"),
+    ("road/junction snapping", ROAD_JUNCTION_SQL, (JUNCTION_SNAP_M,), "planet_osm_roads"),
+]
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+def explain(sql, params, analyze=False):
+    options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+    with pg_connection(statement_timeout_ms=0) as conn, conn.cursor() as cur:
+        cur.execute(f"EXPLAIN ({options}) {sql.strip().rstrip(';')}", params)
+        result = cur.fetchone()[0]
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--analyze", action="store_true", help="run the queries (EXPLAIN ANALYZE)")
+    parser.add_argument("--create", action="store_true", help="create missing indexes first")
+    args = parser.parse_args()
+
+    if args.create:
+        ensure_projected_indexes()
+
+    failed = 0
+    for name, sql, params, table in CHECKS:
+        expected = projected_index_name(table)
+        report = explain(sql, params, analyze=args.analyze)
+        nodes = list(_walk(report["Plan"]))
+
+        indexes = sorted({n["Index Name"] for n in nodes if "Index Name" in n})
+        seq_scans = sorted({n["Relation Name"] for n in nodes if n["Node Type"] == "Seq Scan"})
+        ok = expected in indexes
+
+        print(f"{'OK  ' if ok else 'FAIL'} {name}")
+        print(f"     indexes:    {', '.join(indexes) or '-'}")
+        print(f"     seq scans:  {', '.join(seq_scans) or '-'}")
+        print(f"     total cost: {report['Plan']['Total Cost']:.0f}")
+        if args.analyze:
+            print(f"     time:       {report['Execution Time']:.1f} ms")
+        failed += not ok
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
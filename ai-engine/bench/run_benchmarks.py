@@ -0,0 +1,426 @@
+"""
+Latency benchmark for the impact, map and RAG endpoints.
+
+Runs the FastAPI app in-process (TestClient) against local stand-ins:
+
+- road graph: the in-memory index built from road_edges.csv (memory backend)
+- PostGIS: any reachable instance, e.g. a throwaway container
+      docker run -d -p 5433:5432 -e POSTGRES_PASSWORD=citybrain \\
+          -e POSTGRES_USER=citybrain -e POSTGRES_DB=citybrain postgis/postgis:16-3.4
+  loaded with the same osm2pgsql import, passed as --pg-host/--pg-port
+- Qdrant: a local path (--qdrant-path), ingested from docs/ if empty
+- Gemini: a fake client with a fixed, configurable latency
+
+road_edges.csv only carries road connectivity, not geometry, so it cannot
+stand in for PostGIS; without a database the graph_bfs scenario still
+measures the in-memory impact BFS. Scenarios whose backing service is not
+reachable are skipped and marked so in the output, except that the RAG
+scenarios replace unreachable graph/spatial grounding with empty stand-ins
+(recorded under meta.stand_ins). From ai-engine/:
+
+    python -m bench.run_benchmarks --requests 300 --out bench/results/run.json
+    python -m bench.run_benchmarks --compare bench/results/old.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ENGINE_DIR = os.path.dirname(HERE)
+
+# hop counts requested by the map UI, most traffic at 2-3 hops
+HOP_WEIGHTS = {1: 0.15, 2: 0.30, 3: 0.35, 4: 0.12, 5: 0.08}
+# share of requests for a small set of busy roads, the rest uniform
+HOT_ROAD_SHARE = 0.8
+HOT_ROAD_COUNT = 100
+
+RAG_QUESTIONS = [
+    "What construction is allowed near hospitals?",
+    "Which roads near hospitals need a silence zone?",
+    "What are the buffer zone regulations for hospitals?",
+    "Can a commercial building be built next to a school?",
+    "What is the right of way for arterial roads?",
+    "Are there restrictions on night-time road construction?",
+]
+
+
+class FakeGenerateResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    def __init__(self, latency_s):
+        self.latency_s = latency_s
+
+    def generate_content(self, model, contents, config=None):
+        time.sleep(self.latency_s)
+        if "Return JSON only" in contents:
+            return FakeGenerateResponse(json.dumps({
+                "building_type": ["hospital"],
+                "infrastructure": ["road"],
+            }))
+        return FakeGenerateResponse("Benchmark answer based on the provided context.")
+
+    def generate_content_stream(self, model, contents, config=None):
+        # a third of the latency before the first chunk, the rest spread out
+        words = "Benchmark answer based on the provided context.".split()
+        time.sleep(self.latency_s / 3)
+        for word in words:
+            yield FakeGenerateResponse(word + " ")
+            time.sleep(self.latency_s * 2 / 3 / len(words))
+
+
+class FakeGenaiClient:
+    """
+    Stand-in for google.genai.Client with fixed latency per call.
+    """
+    latency_s = 0.3
+
+    def __init__(self, *args, **kwargs):
+        self.models = FakeModels(self.latency_s)
+
+
+def configure_environment(args):
+    """
+    Point the engine at the stand-ins. Must run before main is imported,
+    since the modules read their configuration at import time.
+    """
+    os.environ["IMPACT_BACKEND"] = "memory"
+    os.environ["ROAD_INDEX_SOURCE"] = "csv"
+    os.environ["ROAD_EDGES_CSV"] = args.road_edges
+    os.environ["QDRANT_PATH"] = args.qdrant_path
+    os.environ["EMBED_CACHE_DIR"] = os.path.join(args.qdrant_path, "embed_cache")
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ["POSTGRES_HOST"] = args.pg_host
+    os.environ["POSTGRES_PORT"] = str(args.pg_port)
+    os.environ["PG_POOL_TIMEOUT_S"] = "5"
+    os.environ.pop("REDIS_URL", None)
+    # the question pool is small; measure the pipeline, not the answer cache
+    os.environ.setdefault("RAG_ANSWER_CACHE_SIZE", "0")
+    if args.neo4j_uri:
+        os.environ["NEO4J_URI"] = args.neo4j_uri
+
+    from google import genai
+    FakeGenaiClient.latency_s = args.llm_latency_ms / 1000.0
+    genai.Client = FakeGenaiClient
+
+
+def postgis_available():
+    from spatial.postgis_client import pg_connection
+    try:
+        with pg_connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM planet_osm_roads LIMIT 1")
+        return True
+    except Exception as e:
+        print(f"PostGIS unavailable, skipping its scenarios: {e}")
+        return False
+
+
+def neo4j_available(driver):
+    try:
+        driver.verify_connectivity()
+        return True
+    except Exception as e:
+        print(f"Neo4j unavailable, skipping its scenarios: {e}")
+        return False
+
+
+def qdrant_ready():
+    from rag.ingest import ingest_pdfs
+    from rag.vector_store import QDRANT_COLLECTION, get_qdrant_client
+    client = get_qdrant_client()
+    try:
+        if client.count(QDRANT_COLLECTION).count > 0:
+            return True
+    except Exception:
+        pass
+    try:
+        print("Ingesting docs/ into the benchmark Qdrant path")
+        return ingest_pdfs(os.path.join(ENGINE_DIR, "docs"))["chunks"] > 0
+    except Exception as e:
+        print(f"Qdrant ingest failed, skipping RAG: {e}")
+        return False
+
+
+def stub_grounding(have_pg, have_neo4j):
+    """
+    Replace RAG grounding stages whose service is down with empty results,
+    so the RAG scenarios time the pipeline instead of connection failures.
+    Returns the names of the replaced stages.
+    """
+    import rag.entity_extractor
+    import rag.query
+
+    stubbed = []
+    if not have_pg:
+        rag.query.analyze_road_hospital_proximity = lambda *a, **kw: []
+        stubbed.append("spatial_grounding")
+    if not have_neo4j:
+        rag.query.resolve_entities = lambda *a, **kw: {}
+        rag.entity_extractor._neo4j_labels = lambda: []
+        stubbed.append("graph_grounding")
+    return stubbed
+
+
+def road_sampler(index, rng):
+    """
+    Road ids drawn like map traffic: a hot set of well-connected roads
+    and a uniform tail.
+    """
+    degree = np.diff(index.indptr)
+    hot = index.node_ids[np.argsort(-degree)[:HOT_ROAD_COUNT]]
+    hops = np.array(list(HOP_WEIGHTS))
+    weights = np.array(list(HOP_WEIGHTS.values()))
+
+    def sample():
+        if rng.random() < HOT_ROAD_SHARE:
+            road = hot[rng.integers(len(hot))]
+        else:
+            road = index.node_ids[rng.integers(len(index.node_ids))]
+        return int(road), int(rng.choice(hops, p=weights))
+
+    return sample
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    v = np.asarray(values)
+    return {
+        "p50_ms": round(float(np.percentile(v, 50)), 2),
+        "p95_ms": round(float(np.percentile(v, 95)), 2),
+        "p99_ms": round(float(np.percentile(v, 99)), 2),
+        "mean_ms": round(float(v.mean()), 2),
+        "max_ms": round(float(v.max()), 2),
+    }
+
+
+def run_scenario(name, make_request, requests, concurrency, warmup):
+    """
+    Fire `requests` calls of make_request(client) from `concurrency`
+    threads; returns latency percentiles, throughput and any per-stage
+    timings the responses reported.
+    """
+    from fastapi.testclient import TestClient
+    from main import app
+
+    local = threading.local()
+
+    def client():
+        if not hasattr(local, "client"):
+            local.client = TestClient(app)
+        return local.client
+
+    for _ in range(warmup):
+        make_request(client())
+
+    latencies, stages, errors = [], {}, 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            response = make_request(client())
+            ok = response.status_code < 400
+            body = response.json() if ok and "json" in response.headers.get("content-type", "") else None
+        except Exception:
+            ok, body = False, None
+        elapsed = (time.perf_counter() - started) * 1000
+
+        with lock:
+            latencies.append(elapsed)
+            if not ok:
+                errors += 1
+            debug = body.get("debug") if isinstance(body, dict) else None
+            if debug:
+                for stage, ms in debug.get("stages_ms", {}).items():
+                    stages.setdefault(stage, []).append(ms)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    result = {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 2) if wall > 0 else 0.0,
+        **percentiles(latencies),
+    }
+    if stages:
+        result["stages"] = {stage: percentiles(ms) for stage, ms in stages.items()}
+
+    print(
+        f"{name:32s} p50 {result['p50_ms']:8.1f} ms  p95 {result['p95_ms']:8.1f} ms  "
+        f"p99 {result['p99_ms']:8.1f} ms  {result['throughput_rps']:7.1f} req/s  "
+        f"errors {errors}"
+    )
+    return result
+
+
+def build_scenarios(args, sample_road, have_pg, have_neo4j, have_qdrant):
+    rng = np.random.default_rng(args.seed + 1)
+
+    def impact(path, needs_pg=False, needs_neo4j=False):
+        def request(client):
+            road, hops = sample_road()
+            return client.get(f"{path}/{road}", params={"hops": hops, "backend": "memory"})
+        return request, (not needs_pg or have_pg) and (not needs_neo4j or have_neo4j)
+
+    def graph_bfs(client):
+        # the memory-backend BFS behind every impact endpoint, minus PostGIS
+        from main import affected_roads_within
+        road, hops = sample_road()
+        affected = affected_roads_within(road, hops, "memory")
+        return httpx.Response(200, json={"affected": len(affected)})
+
+    def rag(client):
+        question = RAG_QUESTIONS[rng.integers(len(RAG_QUESTIONS))]
+        return client.post("/rag/query", params={"question": question, "debug": True})
+
+    def rag_stream(client):
+        # reads the whole stream; first_token_ms is reported as a stage
+        question = RAG_QUESTIONS[rng.integers(len(RAG_QUESTIONS))]
+        params = {"question": question, "stream": "ndjson", "debug": True}
+        with client.stream("POST", "/rag/query/stream", params=params) as response:
+            done = {}
+            for line in response.iter_lines():
+                if line:
+                    event = json.loads(line)
+                    if event["event"] == "done":
+                        done = event["data"]
+        debug = done.get("debug") or {}
+        stages = dict(debug.get("stages_ms", {}), first_token=debug.get("first_token_ms") or 0.0)
+        return httpx.Response(response.status_code, json={"debug": {"stages_ms": stages}})
+
+    return {
+        "graph_bfs": (graph_bfs, True),
+        "impact_semantic": impact("/api/impact/semantic", needs_pg=True),
+        "impact_zones": impact("/api/impact/zones", needs_pg=True, needs_neo4j=True),
+        "impact_hospitals": impact("/api/impact/hospitals", needs_pg=True),
+        "impact_summary": impact("/api/impact/summary", needs_pg=True),
+        "map_violations": (
+            lambda c: c.get("/map/violations/construction-hospitals", params={"limit": 500}),
+            have_pg
+        ),
+        "map_hospital_buffers": (
+            lambda c: c.get("/map/buffer/hospitals", params={"distance": 200}),
+            have_pg
+        ),
+        "map_tile_roads": (
+            lambda c: c.get("/tiles/roads/14/11705/7150.mvt"),
+            have_pg
+        ),
+        "rag_query": (rag, have_qdrant),
+        "rag_query_stream": (rag_stream, have_qdrant),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ENGINE_DIR, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+
+    print(f"\nCompared with {baseline_path} (p95):")
+    for name, result in current.items():
+        old = baseline.get(name, {})
+        if "p95_ms" not in result or "p95_ms" not in old:
+            continue
+        change = (result["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        print(f"  {name:32s} {old['p95_ms']:8.1f} -> {result['p95_ms']:8.1f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the CityBrain engine endpoints")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--rag-requests", type=int, default=30)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--scenarios", help="comma-separated subset to run")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--road-edges", default=os.path.join(ENGINE_DIR, "..", "road_edges.csv"))
+    parser.add_argument("--pg-host", default=os.getenv("POSTGRES_HOST", "localhost"))
+    parser.add_argument("--pg-port", type=int, default=int(os.getenv("POSTGRES_PORT", 5432)))
+    parser.add_argument("--neo4j-uri", default=os.getenv("NEO4J_URI"))
+    parser.add_argument("--qdrant-path", default=os.path.join(tempfile.gettempdir(), "citybrain-bench-qdrant"))
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--out", default=os.path.join(HERE, "results", time.strftime("%Y%m%dT%H%M%S") + ".json"))
+    parser.add_argument("--compare", help="earlier result file to compare p95 against")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ENGINE_DIR)
+    configure_environment(args)
+
+    from fastapi.testclient import TestClient
+    from graph.road_index import get_road_index
+    from main import app, driver
+
+    # runs the startup hooks, which load the road index from the CSV
+    with TestClient(app):
+        pass
+
+    have_pg = postgis_available()
+    have_neo4j = neo4j_available(driver)
+    have_qdrant = qdrant_ready()
+    stand_ins = stub_grounding(have_pg, have_neo4j) if have_qdrant else []
+
+    sample_road = road_sampler(get_road_index(), np.random.default_rng(args.seed))
+    scenarios = build_scenarios(args, sample_road, have_pg, have_neo4j, have_qdrant)
+    selected = args.scenarios.split(",") if args.scenarios else list(scenarios)
+
+    results = {}
+    for name in selected:
+        make_request, available = scenarios[name]
+        if not available:
+            results[name] = {"skipped": True}
+            print(f"{name:32s} skipped")
+            continue
+        requests = args.rag_requests if name.startswith("rag") else args.requests
+        results[name] = run_scenario(name, make_request, requests, args.concurrency, args.warmup)
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "services": {"postgis": have_pg, "neo4j": have_neo4j, "qdrant": have_qdrant},
+            "stand_ins": stand_ins,
+        },
+        "scenarios": results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.out}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
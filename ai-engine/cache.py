@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+REDIS_URL = os.getenv("REDIS_URL")
+
+_redis = None
+_redis_checked = False
+_redis_lock = threading.Lock()
+_caches = {}
+_stats_providers = {}
+
+
+def get_redis():
+    """
+    Shared Redis client, or None when REDIS_URL is unset, the package is
+    missing or the server does not answer. Checked once per process.
+    """
+    global _redis, _redis_checked
+    if _redis_checked:
+        return _redis
+
+    with _redis_lock:
+        if not _redis_checked:
+            if REDIS_URL and redis is not None:
+                try:
+                    client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5)
+                    client.ping()
+                    _redis = client
+                except Exception as e:
+                    print(f"Redis unavailable, caches stay in-process: {e}")
+            _redis_checked = True
+    return _redis
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with an optional per-entry time to live.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+
+            value, expires = item
+            if expires is not None and expires < time.monotonic():
+                del self._data[key]
+                return default
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache:
+    """
+    In-process TTLCache in front of an optional shared Redis tier.
+
+    Redis values go through dumps/loads (JSON by default) and expire with
+    the same TTL. Redis errors are counted and treated as misses.
+    """
+
+    def __init__(self, name, maxsize=1024, ttl=None, dumps=json.dumps, loads=json.loads, use_redis=True):
+        self.name = name
+        self.ttl = ttl
+        self.dumps = dumps
+        self.loads = loads
+        self.use_redis = use_redis
+        self._memory = TTLCache(maxsize, ttl)
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.redis_errors = 0
+
+        _caches[name] = self
+
+    def _redis_key(self, key):
+        parts = key if isinstance(key, tuple) else (key,)
+        return "citybrain:" + self.name + ":" + ":".join(str(p) for p in parts)
+
+    def _count(self, field):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key):
+        value = self._memory.get(key)
+        if value is not None:
+            self._count("memory_hits")
+            return value
+
+        client = get_redis() if self.use_redis else None
+        if client is not None:
+            try:
+                raw = client.get(self._redis_key(key))
+            except Exception:
+                raw = None
+                self._count("redis_errors")
+            if raw is not None:
+                value = self.loads(raw)
+                self._memory.set(key, value)
+                self._count("redis_hits")
+                return value
+
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self._memory.set(key, value)
+
+        client = get_redis() if self.use_redis else None
+        if client is not None:
+            try:
+                client.set(
+                    self._redis_key(key),
+                    self.dumps(value),
+                    # milliseconds, so sub-second TTLs do not become ex=0
+                    px=max(1, int(self.ttl * 1000)) if self.ttl else None
+                )
+            except Exception:
+                self._count("redis_errors")
+
+    def clear(self):
+        """
+        Drop the in-process tier. Redis entries are left to expire; callers
+        put a data version in their keys so stale ones are never read.
+        """
+        self._memory.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.redis_hits + self.misses
+            hits = self.memory_hits + self.redis_hits
+            return {
+                "size": len(self._memory),
+                "max_size": self._memory.maxsize,
+                "memory_hits": self.memory_hits,
+                "redis_hits": self.redis_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "redis_errors": self.redis_errors,
+            }
+
+
+def register_stats(name, stats_fn):
+    """
+    Report a cache that is not a TieredCache through cache_stats().
+    """
+    _stats_providers[name] = stats_fn
+
+
+def cache_stats():
+    stats = {name: c.stats() for name, c in _caches.items()}
+    stats.update({name: fn() for name, fn in _stats_providers.items()})
+    return stats
@@ -0,0 +1,98 @@
+import json
+import os
+import threading
+import time
+
+from cache import TieredCache, get_redis
+
+BFS_CACHE_SIZE = int(os.getenv("BFS_CACHE_SIZE", 512))
+BFS_CACHE_TTL_S = float(os.getenv("BFS_CACHE_TTL_S", 600))
+# how long a worker trusts its copy of the shared graph version
+GRAPH_VERSION_TTL_S = float(os.getenv("GRAPH_VERSION_TTL_S", 1))
+
+GRAPH_VERSION_KEY = "citybrain:graph_version"
+
+_local_version = 0
+_shared_version = None
+_shared_checked = 0.0
+_memory_generation = 0
+_version_lock = threading.Lock()
+
+# Neo4j traversals are worth sharing between workers; road -> hop maps
+# go through JSON as pairs, since JSON object keys are strings
+_cache = TieredCache(
+    "bfs",
+    BFS_CACHE_SIZE,
+    BFS_CACHE_TTL_S,
+    dumps=lambda m: json.dumps(list(m.items())),
+    loads=lambda raw: {int(k): v for k, v in json.loads(raw)}
+)
+
+# in-memory CSR results stay in-process: the BFS costs less than a
+# Redis round trip and each worker has its own index
+_memory_cache = TieredCache("bfs_memory", BFS_CACHE_SIZE, BFS_CACHE_TTL_S, use_redis=False)
+
+
+def graph_version():
+    """
+    Version of the road graph. Shared through Redis when available so a
+    rebuild in one worker invalidates the others; the Redis value is
+    re-read at most every GRAPH_VERSION_TTL_S.
+    """
+    global _shared_version, _shared_checked
+    client = get_redis()
+    if client is None:
+        return _local_version
+
+    now = time.monotonic()
+    if _shared_version is None or now - _shared_checked >= GRAPH_VERSION_TTL_S:
+        try:
+            _shared_version = int(client.get(GRAPH_VERSION_KEY) or 0)
+        except Exception:
+            return _shared_version if _shared_version is not None else _local_version
+        _shared_checked = now
+    return _shared_version
+
+
+def bump_graph_version():
+    global _local_version, _shared_version, _shared_checked
+    with _version_lock:
+        _local_version += 1
+
+    client = get_redis()
+    if client is not None:
+        try:
+            _shared_version = int(client.incr(GRAPH_VERSION_KEY))
+            _shared_checked = time.monotonic()
+        except Exception:
+            pass
+
+    _cache.clear()
+    reset_memory_bfs()
+
+
+def reset_memory_bfs():
+    """
+    Forget in-memory BFS results, e.g. after a new road index is swapped in.
+    """
+    global _memory_generation
+    with _version_lock:
+        _memory_generation += 1
+    _memory_cache.clear()
+
+
+def cached_bfs(road_id, hops, backend, compute):
+    """
+    Return the road -> hop map for (road_id, hops), computing it with
+    compute() on a miss. The result is shared, so treat it as read-only.
+    """
+    if backend == "memory":
+        cache, key = _memory_cache, (_memory_generation, road_id, hops)
+    else:
+        cache, key = _cache, (graph_version(), backend, road_id, hops)
+
+    affected = cache.get(key)
+    if affected is None:
+        affected = compute()
+        cache.set(key, affected)
+    return affected
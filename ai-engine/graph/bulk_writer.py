@@ -0,0 +1,90 @@
+import os
+import time
+import uuid
+
+from graph.bfs_cache import bump_graph_version
+
+NEO4J_BATCH_SIZE = int(os.getenv("NEO4J_BATCH_SIZE", 5000))
+
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT road_osm_id IF NOT EXISTS FOR (r:Road) REQUIRE r.osm_id IS UNIQUE",
+    "CREATE CONSTRAINT zone_zone_id IF NOT EXISTS FOR (z:Zone) REQUIRE z.zone_id IS UNIQUE",
+    "CREATE CONSTRAINT junction_id IF NOT EXISTS FOR (j:Junction) REQUIRE j.id IS UNIQUE",
+    # string ids used by the /build/* endpoints
+    "CREATE INDEX road_id IF NOT EXISTS FOR (r:Road) ON (r.id)",
+    "CREATE INDEX zone_id IF NOT EXISTS FOR (z:Zone) ON (z.id)",
+    "CREATE INDEX hospital_id IF NOT EXISTS FOR (h:Hospital) ON (h.id)",
+    "CREATE INDEX construction_project_id IF NOT EXISTS FOR (c:ConstructionProject) ON (c.id)",
+]
+
+
+def ensure_schema(driver):
+    """
+    Create the constraints/indexes the MERGE lookups rely on. Without
+    them every MERGE in a batch is a label scan.
+    """
+    with driver.session(database="neo4j") as session:
+        for statement in SCHEMA_STATEMENTS:
+            session.run(statement).consume()
+
+
+def iter_pg_batches(conn, sql, params=None, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Stream a PostGIS query through a server-side cursor, yielding lists
+    of at most batch_size rows so the full result never sits in memory.
+    """
+    cur = conn.cursor(name=f"bulk_{uuid.uuid4().hex}")
+    cur.itersize = batch_size
+    try:
+        cur.execute(sql, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+        conn.commit()
+
+
+def _run_batch(tx, cypher, rows):
+    tx.run(cypher, rows=rows).consume()
+
+
+def write_batches(driver, cypher, batches, stage, to_row=None):
+    """
+    Write each batch with one `UNWIND $rows AS row ...` statement inside
+    an explicit write transaction, and report throughput for the stage.
+    """
+    total = 0
+    started = time.perf_counter()
+
+    with driver.session(database="neo4j") as session:
+        for batch in batches:
+            rows = [to_row(r) for r in batch] if to_row else list(batch)
+            if not rows:
+                continue
+            session.execute_write(_run_batch, cypher, rows)
+            total += len(rows)
+
+    bump_graph_version()
+
+    elapsed = time.perf_counter() - started
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"{stage}: {total} rows in {elapsed:.1f}s ({rate:.0f} rows/s)")
+    return total
+
+
+def delete_in_batches(driver, match, var, detach=True, batch_size=NEO4J_BATCH_SIZE):
+    """
+    Delete whatever `match` binds to `var` in bounded transactions
+    instead of one huge one.
+    """
+    action = "DETACH DELETE" if detach else "DELETE"
+    with driver.session(database="neo4j") as session:
+        session.run(f"""
+            {match}
+            CALL {{ WITH {var} {action} {var} }} IN TRANSACTIONS OF {int(batch_size)} ROWS
+        """).consume()
+
+    bump_graph_version()
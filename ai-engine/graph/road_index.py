@@ -0,0 +1,185 @@
+import csv
+import os
+import threading
+
+import numpy as np
+
+from graph.bfs_cache import graph_version, reset_memory_bfs
+
+# snapshot | neo4j | csv; a missing snapshot falls back to neo4j
+ROAD_INDEX_SOURCE = os.getenv("ROAD_INDEX_SOURCE", "snapshot")
+ROAD_EDGES_CSV = os.getenv("ROAD_EDGES_CSV", "road_edges.csv")
+
+
+class RoadIndex:
+    """
+    Process-local CSR adjacency of the CONNECTS_TO road network.
+
+    node_ids holds the sorted osm_ids, and the neighbours of node i are
+    indices[indptr[i]:indptr[i + 1]]. Edges are stored in both directions
+    so BFS matches the undirected APOC traversal.
+    """
+
+    def __init__(self, node_ids, indptr, indices):
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, src, dst, extra_nodes=None):
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+
+        parts = [src, dst]
+        if extra_nodes is not None:
+            parts.append(np.asarray(extra_nodes, dtype=np.int64))
+        node_ids = np.unique(np.concatenate(parts))
+
+        a = np.searchsorted(node_ids, src)
+        b = np.searchsorted(node_ids, dst)
+
+        # symmetric, without self loops or duplicate edges
+        rows = np.concatenate([a, b])
+        cols = np.concatenate([b, a])
+        keep = rows != cols
+        pairs = np.unique(np.stack([rows[keep], cols[keep]], axis=1), axis=0)
+
+        counts = np.bincount(pairs[:, 0], minlength=len(node_ids))
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(node_ids, indptr, pairs[:, 1].astype(np.int64))
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self):
+        return len(self.indices) // 2
+
+    def position(self, osm_id):
+        i = np.searchsorted(self.node_ids, osm_id)
+        if i < len(self.node_ids) and self.node_ids[i] == osm_id:
+            return int(i)
+        return None
+
+    def bfs(self, root_osm_id, max_hops):
+        """
+        Return {osm_id: hop} for every road within max_hops of the root,
+        the same mapping the impact endpoints build from spanningTree.
+        """
+        start = self.position(root_osm_id)
+        if start is None:
+            return {}
+
+        hops = np.full(len(self.node_ids), -1, dtype=np.int32)
+        hops[start] = 0
+        frontier = np.array([start], dtype=np.int64)
+
+        for level in range(1, max_hops + 1):
+            starts = self.indptr[frontier]
+            lengths = self.indptr[frontier + 1] - starts
+            total = int(lengths.sum())
+            if total == 0:
+                break
+
+            # gather all neighbour slices of the frontier in one shot
+            offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            neighbours = self.indices[offsets + np.arange(total)]
+
+            neighbours = np.unique(neighbours)
+            neighbours = neighbours[hops[neighbours] < 0]
+            if len(neighbours) == 0:
+                break
+
+            hops[neighbours] = level
+            frontier = neighbours
+
+        reached = np.nonzero(hops >= 0)[0]
+        return dict(zip(self.node_ids[reached].tolist(), hops[reached].tolist()))
+
+
+def load_from_neo4j(driver):
+    with driver.session(database="neo4j") as session:
+        nodes = [
+            r["osm_id"]
+            for r in session.run(
+                "MATCH (r:Road) WHERE r.osm_id IS NOT NULL RETURN r.osm_id AS osm_id"
+            )
+        ]
+        edges = [
+            (r["a"], r["b"])
+            for r in session.run("""
+                MATCH (a:Road)-[:CONNECTS_TO]->(b:Road)
+                WHERE a.osm_id IS NOT NULL AND b.osm_id IS NOT NULL
+                RETURN a.osm_id AS a, b.osm_id AS b
+            """)
+        ]
+
+    src = [int(a) for a, _ in edges]
+    dst = [int(b) for _, b in edges]
+    return RoadIndex.from_edges(src, dst, extra_nodes=[int(n) for n in nodes])
+
+
+def load_from_csv(path=ROAD_EDGES_CSV):
+    src, dst = [], []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            src.append(int(row["a"]))
+            dst.append(int(row["b"]))
+    return RoadIndex.from_edges(src, dst)
+
+
+_index = None
+_index_graph_version = None
+_lock = threading.Lock()
+
+
+def get_road_index():
+    return _index
+
+
+def road_index_graph_version():
+    """
+    Graph version the loaded index reflects, None before the first load.
+    """
+    return _index_graph_version
+
+
+def use_road_index(index, source, version=None):
+    """
+    Swap in an already built index, e.g. one mapped from a snapshot.
+    Loading only reads the graph, so the shared graph version is left
+    alone (the writers bump it); `version` is the one read before the
+    index was loaded.
+    """
+    global _index, _index_graph_version
+    if version is None:
+        version = graph_version()
+    with _lock:
+        _index = index
+        _index_graph_version = version
+
+    reset_memory_bfs()
+    print(
+        f"Road index loaded from {source}: "
+        f"{index.node_count} roads, {index.edge_count} connections"
+    )
+    return index
+
+
+def refresh_road_index(driver=None, source=None):
+    """
+    (Re)load the index and swap it in atomically. Neo4j stays the source
+    of truth; the CSV export is only used when asked for explicitly.
+    """
+    source = source or ROAD_INDEX_SOURCE
+    # read first, so a write landing during the load triggers another one
+    version = graph_version()
+    if source == "csv":
+        index = load_from_csv()
+    else:
+        source = "neo4j"
+        index = load_from_neo4j(driver)
+    return use_road_index(index, source, version)
@@ -0,0 +1,273 @@
+import json
+import os
+import shutil
+import time
+import uuid
+
+import numpy as np
+
+from graph.road_index import RoadIndex, get_road_index, load_from_neo4j
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "/data/snapshot")
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", 2))
+SNAPSHOT_FORMAT = 1
+
+MANIFEST = "manifest.json"
+
+
+class GraphSnapshot:
+    """
+    Derived road graph and link tables as flat NumPy arrays.
+
+    Roads are the RoadIndex CSR (road_ids, road_indptr, road_indices).
+    Zone membership is a second CSR over the same road positions pointing
+    into zone_ids/zone_names, and hospital snapping a CSR from hospitals
+    to their nearest road osm_ids, closest first. Loaded with
+    mmap_mode="r", so workers share the pages and nothing is parsed.
+    """
+
+    ARRAYS = [
+        "road_ids", "road_indptr", "road_indices",
+        "zone_ids", "zone_names", "road_zone_indptr", "road_zone_indices",
+        "hospital_ids", "hospital_names", "hospital_lonlat",
+        "hospital_road_indptr", "hospital_roads",
+    ]
+
+    def __init__(self, arrays, manifest=None):
+        self.arrays = arrays
+        self.manifest = manifest or {}
+        for name, value in arrays.items():
+            setattr(self, name, value)
+        self._zone_totals = None
+        self._road_index = None
+
+    def road_index(self):
+        if self._road_index is None:
+            self._road_index = RoadIndex(self.road_ids, self.road_indptr, self.road_indices)
+        return self._road_index
+
+    def hospitals(self):
+        """
+        Same shape as spatial.hospital_roads.get_hospital_roads().
+        """
+        return [
+            {
+                "hospital_id": int(self.hospital_ids[i]),
+                "name": str(self.hospital_names[i]) or None,
+                "lat": float(self.hospital_lonlat[i, 1]),
+                "lon": float(self.hospital_lonlat[i, 0]),
+                "roads": self.hospital_roads[
+                    self.hospital_road_indptr[i]:self.hospital_road_indptr[i + 1]
+                ].tolist()
+            }
+            for i in range(len(self.hospital_ids))
+        ]
+
+    def zone_severity(self, road_ids):
+        """
+        Per-zone share of roads affected, like ZONE_SEVERITY_CYPHER:
+        [{zone_id, zone_name, affected_roads, total_roads, severity}],
+        most affected first.
+        """
+        if self._zone_totals is None:
+            self._zone_totals = np.bincount(self.road_zone_indices, minlength=len(self.zone_ids))
+
+        road_ids = np.unique(np.asarray(list(road_ids), dtype=np.int64))
+        pos = np.searchsorted(self.road_ids, road_ids)
+        found = pos < len(self.road_ids)
+        found[found] = self.road_ids[pos[found]] == road_ids[found]
+        pos = pos[found]
+
+        starts = self.road_zone_indptr[pos]
+        lengths = self.road_zone_indptr[pos + 1] - starts
+        total = int(lengths.sum())
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        zones = self.road_zone_indices[offsets + np.arange(total)]
+
+        affected = np.bincount(zones, minlength=len(self.zone_ids))
+        hit = np.nonzero(affected)[0]
+        severity = np.round(affected[hit] / self._zone_totals[hit], 3)
+
+        return [
+            {
+                "zone_id": int(self.zone_ids[z]),
+                "zone_name": str(self.zone_names[z]) or None,
+                "affected_roads": int(affected[z]),
+                "total_roads": int(self._zone_totals[z]),
+                "severity": float(s),
+            }
+            for z, s in sorted(zip(hit, severity), key=lambda t: -t[1])
+        ]
+
+
+def _csr(keys, groups, values):
+    """
+    CSR of `values` grouped by position of `groups` in sorted `keys`.
+    """
+    keys = np.asarray(keys)
+    groups = np.asarray(groups, dtype=np.int64)
+    values = np.asarray(values)
+
+    pos = np.searchsorted(keys, groups)
+    order = np.argsort(pos, kind="stable")
+    counts = np.bincount(pos, minlength=len(keys))
+
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return indptr, values[order]
+
+
+def _zone_links_from_neo4j(driver):
+    with driver.session(database="neo4j") as session:
+        zones = [
+            (int(r["zone_id"]), r["name"] or "")
+            for r in session.run("""
+                MATCH (z:Zone) WHERE z.zone_id IS NOT NULL
+                RETURN z.zone_id AS zone_id, z.name AS name
+            """)
+        ]
+        links = [
+            (int(r["road"]), int(r["zone"]))
+            for r in session.run("""
+                MATCH (r:Road)-[:LOCATED_IN]->(z:Zone)
+                WHERE r.osm_id IS NOT NULL AND z.zone_id IS NOT NULL
+                RETURN DISTINCT r.osm_id AS road, z.zone_id AS zone
+            """)
+        ]
+    return zones, links
+
+
+def build_snapshot(driver, hospitals, index=None):
+    index = index or load_from_neo4j(driver)
+    zones, links = _zone_links_from_neo4j(driver)
+
+    zones.sort()
+    zone_ids = np.array([z for z, _ in zones], dtype=np.int64)
+    zone_names = np.array([n for _, n in zones], dtype=str)
+
+    links = [(r, z) for r, z in links if index.position(r) is not None]
+    link_roads = np.array([r for r, _ in links], dtype=np.int64)
+    link_zones = np.searchsorted(zone_ids, np.array([z for _, z in links], dtype=np.int64))
+    road_zone_indptr, road_zone_indices = _csr(index.node_ids, link_roads, link_zones)
+
+    hospitals = sorted(hospitals, key=lambda h: h["hospital_id"])
+    hospital_ids = np.array([h["hospital_id"] for h in hospitals], dtype=np.int64)
+    hospital_road_indptr, hospital_roads = _csr(
+        hospital_ids,
+        [h["hospital_id"] for h in hospitals for _ in h["roads"]],
+        np.array([r for h in hospitals for r in h["roads"]], dtype=np.int64)
+    )
+
+    return GraphSnapshot({
+        "road_ids": np.asarray(index.node_ids, dtype=np.int64),
+        "road_indptr": np.asarray(index.indptr, dtype=np.int64),
+        "road_indices": np.asarray(index.indices, dtype=np.int64),
+        "zone_ids": zone_ids,
+        "zone_names": zone_names,
+        "road_zone_indptr": road_zone_indptr,
+        "road_zone_indices": road_zone_indices.astype(np.int64),
+        "hospital_ids": hospital_ids,
+        "hospital_names": np.array([h["name"] or "" for h in hospitals], dtype=str),
+        "hospital_lonlat": np.array(
+            [(h["lon"], h["lat"]) for h in hospitals], dtype=np.float64
+        ).reshape(-1, 2),
+        "hospital_road_indptr": hospital_road_indptr,
+        "hospital_roads": hospital_roads,
+    })
+
+
+def write_snapshot(snapshot, directory=SNAPSHOT_DIR):
+    """
+    Write the arrays into a fresh version directory, then point the
+    manifest at it with an atomic rename. Processes that still map an
+    older version keep reading it; only SNAPSHOT_KEEP versions are kept.
+    """
+    version = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:6]
+    path = os.path.join(directory, version)
+    os.makedirs(path)
+
+    files = {}
+    for name in GraphSnapshot.ARRAYS:
+        array = snapshot.arrays[name]
+        np.save(os.path.join(path, name + ".npy"), array, allow_pickle=False)
+        files[name] = {"shape": list(array.shape), "dtype": str(array.dtype)}
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "version": version,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "roads": len(snapshot.road_ids),
+        "connections": len(snapshot.road_indices) // 2,
+        "zones": len(snapshot.zone_ids),
+        "road_zone_links": len(snapshot.road_zone_indices),
+        "hospitals": len(snapshot.hospital_ids),
+        "files": files,
+    }
+
+    tmp = os.path.join(directory, f".{MANIFEST}.{version}")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, os.path.join(directory, MANIFEST))
+
+    versions = sorted(
+        d for d in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, d))
+    )
+    for old in versions[:-SNAPSHOT_KEEP]:
+        shutil.rmtree(os.path.join(directory, old), ignore_errors=True)
+
+    print(f"Graph snapshot {version} written to {path}")
+    return manifest
+
+
+def manifest_version(directory=SNAPSHOT_DIR):
+    """
+    Version the manifest currently points at, or None if there is none.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f).get("version")
+    except (OSError, ValueError):
+        return None
+
+
+def load_snapshot(directory=SNAPSHOT_DIR):
+    """
+    Memory-map the current snapshot, or return None if there is none.
+    """
+    manifest_path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        print(f"Ignoring graph snapshot with format {manifest.get('format')}")
+        return None
+
+    path = os.path.join(directory, manifest["version"])
+    arrays = {
+        name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r", allow_pickle=False)
+        for name in GraphSnapshot.ARRAYS
+    }
+    return GraphSnapshot(arrays, manifest)
+
+
+_snapshot = None
+
+
+def get_snapshot():
+    """
+    The snapshot in use, or None once the road index has been replaced
+    by one that was not mapped from it (e.g. reloaded from Neo4j after a
+    write), since its zone membership may be stale then.
+    """
+    snapshot = _snapshot
+    if snapshot is None or get_road_index() is not snapshot.road_index():
+        return None
+    return snapshot
+
+
+def use_snapshot(snapshot):
+    global _snapshot
+    _snapshot = snapshot
@@ -1,18 +1,66 @@
 import json
 from rag.ingest import ingest_pdfs
-from rag.query import rag_query
-from spatial.geometry_fetcher import fetch_geometries
-from spatial.geojson import to_feature_collection
+from rag.query import rag_query_async, rag_query_stream
+from spatial.geometry_fetcher import fetch_geometries, fetch_geometries_by_ids, highlight_features_sql
+from spatial.geojson import feature_sql, stream_features
 from spatial.buffer_fetcher import fetch_hospital_buffers
 from spatial.geojson import to_feature_collection
-from spatial.violation_detector import detect_construction_hospital_violations
+from spatial.violation_detector import (
+    detect_construction_hospital_violations,
+    refresh_violations,
+    violation_features_sql,
+)
+from spatial.tiles import InvalidTile, UnknownLayer, get_tile
+from spatial.query_cache import invalidate_spatial_cache
+from spatial.schema import ensure_projected_indexes
+from spatial.tiled_build import owned_by_tile, run_tiled_build
+from spatial.road_locator import nearest_roads, refresh_road_locator
+from spatial.spatial_analyzer import JUNCTION_SNAP_M, ROAD_JUNCTION_SQL
+from spatial.buffer_materializer import (
+    BUFFER_TABLE,
+    ensure_hospital_buffers,
+    refresh_hospital_buffers,
+)
 from rag.schemas import RagAnswer
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from itertools import chain
+from spatial.postgis_client import pg_connection, pool_stats
+from cache import cache_stats
+from spatial.hospital_roads import (
+    build_hospital_road_table,
+    get_hospital_roads,
+    nearest_unaffected_roads,
+    prime_hospital_roads,
+)
+from graph.road_index import (
+    ROAD_INDEX_SOURCE,
+    get_road_index,
+    refresh_road_index,
+    road_index_graph_version,
+    use_road_index,
+)
+from graph.snapshot import (
+    build_snapshot,
+    get_snapshot,
+    load_snapshot,
+    manifest_version,
+    use_snapshot,
+    write_snapshot,
+)
+from graph.bfs_cache import cached_bfs, graph_version
+from graph.bulk_writer import (
+    delete_in_batches,
+    ensure_schema,
+    iter_pg_batches,
+    write_batches,
+)
+from fastapi import FastAPI, HTTPException, Request, Response
 from neo4j import GraphDatabase
-import psycopg2
 
 import os
+import threading
+import time
 from typing import List, Optional, Literal
 from pydantic import BaseModel
 
@@ -52,308 +100,481 @@ NEO4J_URI = os.getenv("NEO4J_URI", "bolt://neo4j:7687")
 NEO4J_USER = os.getenv("NEO4J_USER", "neo4j")
 NEO4J_PASS = os.getenv("NEO4J_PASSWORD", os.getenv("NEO4J_PASS", "password"))
 
-PG_HOST = os.getenv("POSTGRES_HOST", "postgis")
-PG_PORT = int(os.getenv("POSTGRES_PORT", 5432))
-PG_DB = os.getenv("POSTGRES_DB", "citybrain")
-PG_USER = os.getenv("POSTGRES_USER", "citybrain")
-PG_PASS = os.getenv("POSTGRES_PASSWORD", "citybrain")
+# "memory" answers impact BFS from the in-process road index,
+# "neo4j" runs apoc.path.spanningTree as before
+IMPACT_BACKEND = os.getenv("IMPACT_BACKEND", "memory")
+ImpactBackend = Literal["memory", "neo4j"]
+
+# how often a worker looks for rebuilds done by other workers
+GRAPH_SYNC_INTERVAL_S = float(os.getenv("GRAPH_SYNC_INTERVAL_S", 2))
 
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
-pg_conn = psycopg2.connect(
-    host=PG_HOST,
-    port=PG_PORT,
-    database=PG_DB,
-    user=PG_USER,
-    password=PG_PASS
-)
 
-def get_pg_conn():
-    return psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASS
+_seen_manifest = None
+
+
+def _use_snapshot_index(snapshot, version):
+    global _seen_manifest
+    use_road_index(snapshot.road_index(), f"snapshot {snapshot.manifest['version']}", version)
+    use_snapshot(snapshot)
+    prime_hospital_roads(snapshot.hospitals())
+    _seen_manifest = snapshot.manifest["version"]
+
+
+@app.on_event("startup")
+def load_road_index():
+    try:
+        version = graph_version()
+        snapshot = load_snapshot() if ROAD_INDEX_SOURCE == "snapshot" else None
+        if snapshot is not None:
+            _use_snapshot_index(snapshot, version)
+        else:
+            refresh_road_index(driver)
+    except Exception as e:
+        print(f"Road index not loaded, impact endpoints fall back to Neo4j: {e}")
+
+    threading.Thread(target=_follow_road_graph, name="road-graph-sync", daemon=True).start()
+
+    try:
+        refresh_road_locator()
+    except Exception as e:
+        print(f"Road locator not loaded, it will load on first use: {e}")
+
+
+def sync_road_graph():
+    """
+    Follow rebuilds done by other workers: remap when the snapshot
+    manifest moves, and reload from the source when the graph has been
+    written since this worker's index was loaded (the snapshot is then
+    dropped until the next export). A worker whose startup load failed,
+    e.g. because Neo4j was not ready yet, keeps retrying here.
+    """
+    if ROAD_INDEX_SOURCE == "snapshot":
+        current = manifest_version()
+        if current is not None and current != _seen_manifest:
+            version = graph_version()
+            snapshot = load_snapshot()
+            if snapshot is not None:
+                _use_snapshot_index(snapshot, version)
+                return
+
+    loaded = road_index_graph_version()
+    if get_road_index() is None or graph_version() != loaded:
+        refresh_road_index(driver)
+
+
+def _follow_road_graph():
+    while True:
+        time.sleep(GRAPH_SYNC_INTERVAL_S)
+        try:
+            sync_road_graph()
+        except Exception as e:
+            print(f"Road graph sync failed: {e}")
+
+
+def rebuild_snapshot():
+    """
+    Export the current road graph, zone membership and hospital snapping
+    for other engine processes to map, and switch to it here.
+    """
+    version = graph_version()
+    snapshot = build_snapshot(driver, get_hospital_roads())
+    manifest = write_snapshot(snapshot)
+    _use_snapshot_index(load_snapshot(), version)
+    return {k: v for k, v in manifest.items() if k != "files"}
+
+
+def _use_memory_backend(backend):
+    """
+    Whether BFS runs on the in-process road index. The configured default
+    falls back to Neo4j while no index is loaded; an explicit
+    backend=memory gets a 503 instead of another backend's results.
+    """
+    if get_road_index() is not None:
+        return (backend or IMPACT_BACKEND) == "memory"
+    if backend == "memory":
+        raise HTTPException(status_code=503, detail="Road index not loaded; memory backend unavailable")
+    return False
+
+
+def affected_roads_within(road_id: int, hops: int, backend=None):
+    """
+    Map every road reachable from road_id within hops to its hop count.
+    """
+    if _use_memory_backend(backend):
+        return cached_bfs(
+            road_id, hops, "memory",
+            lambda: get_road_index().bfs(road_id, hops)
+        )
+
+    return cached_bfs(
+        road_id, hops, "neo4j",
+        lambda: _neo4j_affected_roads(road_id, hops)
     )
 
-def build_junctions():
-    print("Building Junction nodes")
 
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT id, ST_Y(geom), ST_X(geom)
-        FROM road_junctions
-    """)
-    rows = cur.fetchall()
+def _neo4j_affected_roads(road_id: int, hops: int):
+    with driver.session(database="neo4j") as neo:
+        records = neo.run("""
+        MATCH (root:Road {osm_id: $road})
+        CALL apoc.path.spanningTree(
+          root,
+          {
+            relationshipFilter: "CONNECTS_TO",
+            minLevel: 0,
+            maxLevel: $hops,
+            bfs: true
+          }
+        )
+        YIELD path
+        WITH last(nodes(path)) AS r, length(path) AS hop
+        RETURN r.osm_id AS road_id, hop
+        """, road=road_id, hops=hops)
+
+        return {r["road_id"]: r["hop"] for r in records}
 
-    with driver.session() as session:
-        session.run("MATCH (j:Junction) DETACH DELETE j")
 
-        for jid, lat, lon in rows:
-            session.run("""
-                MERGE (j:Junction {id: $id})
-                SET j.lat = $lat,
-                    j.lon = $lon
-            """, id=jid, lat=float(lat), lon=float(lon))
+def build_junctions():
+    print("Building Junction nodes")
+    ensure_schema(driver)
+    delete_in_batches(driver, "MATCH (j:Junction)", "j")
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (j:Junction {id: row.id})
+            SET j.lat = row.lat,
+                j.lon = row.lon
+            """,
+            iter_pg_batches(pg, """
+                SELECT id, ST_Y(geom), ST_X(geom)
+                FROM road_junctions
+            """),
+            "Junction nodes",
+            to_row=lambda r: {"id": r[0], "lat": float(r[1]), "lon": float(r[2])}
+        )
 
-    cur.close()
-    print(f"Inserted {len(rows)} Junctions")
+    print(f"Inserted {count} Junctions")
 
 def link_roads_to_junctions():
     print("Linking Roads to Junctions")
+    ensure_schema(driver)
+    ensure_projected_indexes()
+    delete_in_batches(driver, "MATCH ()-[r:MEETS_AT]->()", "r", detach=False)
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (j:Junction {id: row.jid})
+            MATCH (r:Road {osm_id: row.rid})
+            MERGE (r)-[:MEETS_AT]->(j)
+            """,
+            iter_pg_batches(pg, ROAD_JUNCTION_SQL, (JUNCTION_SNAP_M,)),
+            "Road-Junction links",
+            to_row=lambda r: {"jid": r[0], "rid": int(r[1])}
+        )
 
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT
-          j.id,
-          r.osm_id
-        FROM road_junctions j
-        JOIN planet_osm_roads r
-          ON ST_DWithin(j.geom, r.way, 0.00005)
-    """)
-    rows = cur.fetchall()
-
-    with driver.session() as session:
-        session.run("MATCH ()-[r:MEETS_AT]->() DELETE r")
-
-        for jid, road_id in rows:
-            session.run("""
-                MATCH (j:Junction {id: $jid})
-                MATCH (r:Road {osm_id: $rid})
-                MERGE (r)-[:MEETS_AT]->(j)
-            """, jid=jid, rid=int(road_id))
-
-    cur.close()
-    print(f"Linked {len(rows)} road–junction pairs")
+    print(f"Linked {count} road–junction pairs")
 
 def rebuild_real_construction_projects():
     print("Rebuilding REAL ConstructionProject nodes from OSM")
+    ensure_schema(driver)
+    delete_in_batches(driver, "MATCH (c:ConstructionProject)", "c")
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (c:ConstructionProject {id: row.id})
+            SET c.name = row.name,
+                c.type = row.type,
+                c.risk_factor = row.risk
+            """,
+            iter_pg_batches(pg, """
+                SELECT id, name, project_type, risk_factor
+                FROM construction_projects
+            """),
+            "ConstructionProject nodes",
+            to_row=lambda r: {"id": r[0], "name": r[1], "type": r[2], "risk": float(r[3])}
+        )
 
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT id, name, project_type, risk_factor
-        FROM construction_projects
-    """)
-    rows = cur.fetchall()
-
-    with driver.session() as session:
-        session.run("MATCH (c:ConstructionProject) DETACH DELETE c")
-
-        for cid, name, ptype, risk in rows:
-            session.run("""
-                MERGE (c:ConstructionProject {id: $id})
-                SET c.name = $name,
-                    c.type = $type,
-                    c.risk_factor = $risk
-            """, id=cid, name=name, type=ptype, risk=float(risk))
-
-    cur.close()
-    print(f"Inserted {len(rows)} REAL construction projects")
+    print(f"Inserted {count} REAL construction projects")
 
 
 def link_real_construction_to_roads():
     print("Linking REAL Construction Projects to Roads")
+    ensure_schema(driver)
+    delete_in_batches(driver, "MATCH ()-[r:AFFECTS]->()", "r", detach=False)
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (c:ConstructionProject {id: row.pid})
+            MATCH (r:Road {osm_id: row.rid})
+            MERGE (c)-[:AFFECTS {severity: c.risk_factor}]->(r)
+            """,
+            iter_pg_batches(pg, """
+                SELECT project_id, road_osm_id
+                FROM construction_road_links
+            """),
+            "Construction-Road links",
+            to_row=lambda r: {"pid": r[0], "rid": int(r[1])}
+        )
+
+    print(f"Linked {count} REAL construction-road pairs")
 
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT project_id, road_osm_id
-        FROM construction_road_links
-    """)
-    rows = cur.fetchall()
-
-    with driver.session() as session:
-        session.run("MATCH ()-[r:AFFECTS]->() DELETE r")
-
-        for pid, rid in rows:
-            session.run("""
-                MATCH (c:ConstructionProject {id: $pid})
-                MATCH (r:Road {osm_id: $rid})
-                MERGE (c)-[:AFFECTS {severity: c.risk_factor}]->(r)
-            """, pid=pid, rid=int(rid))
-
-    cur.close()
-    print(f"Linked {len(rows)} REAL construction-road pairs")
-
-def build_road_zone_links():
-    print("Linking Road -> Zone using PostGIS spatial join")
-
-    conn = psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASS
+def build_road_zone_links(resume: bool = False):
+    print("Linking Road -> Zone using tiled PostGIS spatial joins")
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        if not resume:
+            cur.execute("DROP TABLE IF EXISTS road_zone_links")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS road_zone_links (
+                road_osm_id BIGINT,
+                zone_osm_id BIGINT,
+                PRIMARY KEY (road_osm_id, zone_osm_id)
+            );
+        """)
+        conn.commit()
+
+    count = run_tiled_build(
+        "road_zone_links",
+        "road_zone_links",
+        ["road_osm_id", "zone_osm_id"],
+        "planet_osm_line",
+        f"""
+            SELECT r.osm_id, z.osm_id
+            FROM planet_osm_line r
+            JOIN planet_osm_polygon z
+              ON ST_Intersects(r.way, z.way)
+            WHERE z.admin_level IN ('5','6')
+              AND {owned_by_tile("r.way")}
+        """,
+        resume=resume
     )
-    cur = conn.cursor()
-
-    cur.execute("""
-        DROP TABLE IF EXISTS road_zone_links;
-        CREATE TABLE road_zone_links (
-            road_osm_id BIGINT,
-            zone_osm_id BIGINT
-        );
-    """)
-
-    cur.execute("""
-        INSERT INTO road_zone_links (road_osm_id, zone_osm_id)
-        SELECT 
-            r.osm_id,
-            z.osm_id
-        FROM planet_osm_line r
-        JOIN planet_osm_polygon z
-          ON ST_Intersects(r.way, z.way)
-        WHERE z.admin_level IN ('5','6');
-    """)
-
-    cur.execute("SELECT COUNT(*) FROM road_zone_links;")
-    count = cur.fetchone()[0]
-
-    conn.commit()
-    cur.close()
-    conn.close()
 
     print(f"Found {count} Road-Zone spatial intersections")
     return {"pairs": count}
 
 
+def build_road_connection_pairs(resume: bool = False):
+    """
+    Touching road pairs (a < b) in road_connections, computed per tile.
+    """
+    with pg_connection() as conn, conn.cursor() as cur:
+        if not resume:
+            cur.execute("DROP TABLE IF EXISTS road_connections")
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS road_connections (
+                a BIGINT,
+                b BIGINT,
+                PRIMARY KEY (a, b)
+            );
+        """)
+        conn.commit()
+
+    return run_tiled_build(
+        "road_connections",
+        "road_connections",
+        ["a", "b"],
+        "planet_osm_roads",
+        f"""
+            SELECT r1.osm_id, r2.osm_id
+            FROM planet_osm_roads r1
+            JOIN planet_osm_roads r2
+              ON ST_Touches(r1.way, r2.way)
+            WHERE r1.osm_id < r2.osm_id
+              AND {owned_by_tile("r1.way")}
+        """,
+        resume=resume
+    )
+
+
 def rebuild_roads_from_postgis_to_neo4j():
     print("Rebuilding Road nodes from PostGIS into Neo4j")
-    pg = pg_conn
-    cur = pg.cursor()
+    ensure_schema(driver)
+    delete_in_batches(driver, "MATCH (r:Road)", "r")
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (:Road {osm_id: row.id})
+            """,
+            iter_pg_batches(pg, """
+                SELECT osm_id
+                FROM planet_osm_roads
+                WHERE osm_id IS NOT NULL
+            """),
+            "Road nodes",
+            to_row=lambda r: {"id": int(r[0])}
+        )
 
-    cur.execute("""
-        SELECT osm_id
-        FROM planet_osm_roads
-        WHERE osm_id IS NOT NULL
-    """)
-    roads = cur.fetchall()
+    print(f"Inserted {count} Road nodes into Neo4j")
+    refresh_road_index(driver)
 
-    with driver.session() as session:
-        session.run("MATCH (r:Road) DETACH DELETE r")
 
-        for (osm_id,) in roads:
-            session.run(
-                "MERGE (:Road {osm_id: $id})",
-                id=int(osm_id)
-            )
+def rebuild_zones_from_postgis():
+    print("Rebuilding Zone nodes from PostGIS")
+    ensure_schema(driver)
+    delete_in_batches(driver, "MATCH (z:Zone)", "z")
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (z:Zone {zone_id: row.zone_id})
+            SET z.name = row.name,
+                z.area = row.area
+            """,
+            iter_pg_batches(pg, """
+                SELECT
+                    CAST(osm_id AS BIGINT) AS zone_id,
+                    name,
+                    ST_Area(way) AS area
+                FROM planet_osm_polygon
+                WHERE boundary = 'administrative'
+                  AND admin_level IN ('6','7','8')
+                  AND osm_id IS NOT NULL
+                  AND name IS NOT NULL
+            """),
+            "Zone nodes",
+            to_row=lambda r: {"zone_id": int(r[0]), "name": r[1], "area": float(r[2])}
+        )
 
-    print(f"Inserted {len(roads)} Road nodes into Neo4j")
+    print(f"Inserted {count} Zones into Neo4j")
 
 
-def rebuild_zones_from_postgis():
-    print("Rebuilding Zone nodes from PostGIS")
-    pg = pg_conn
-    cur = pg.cursor()
-
-    cur.execute("""
-        SELECT
-            CAST(osm_id AS BIGINT) AS zone_id,
-            name,
-            ST_Area(way) AS area
-        FROM planet_osm_polygon
-        WHERE boundary = 'administrative'
-          AND admin_level IN ('6','7','8')
-          AND osm_id IS NOT NULL
-          AND name IS NOT NULL
-    """)
-
-    zones = cur.fetchall()
-
-    with driver.session() as session:
-        session.run("MATCH (z:Zone) DETACH DELETE z")
-
-        for zone_id, name, area in zones:
-            session.run(""" 
-                MERGE (z:Zone {zone_id: $zone_id})
-                SET z.name = $name,
-                    z.area = $area
-            """, zone_id=int(zone_id), name=name, area=float(area))
-
-    print(f"Inserted {len(zones)} Zones into Neo4j")
-
-
-
-def build_road_connectivity_from_postgis():
-    pg = pg_conn
-    cur = pg.cursor()
-    neo = driver.session(database="neo4j")
-
-    cur.execute("""
-        SELECT r1.osm_id, r2.osm_id
-        FROM planet_osm_roads r1
-        JOIN planet_osm_roads r2
-        ON ST_Touches(r1.way, r2.way)
-        WHERE r1.osm_id <> r2.osm_id
-        LIMIT 200000;
-    """)
-
-    for a, b in cur.fetchall():
-        neo.run("""
-            MATCH (r1:Road {osm_id: $a}), (r2:Road {osm_id: $b})
+
+def build_road_connectivity_from_postgis(resume: bool = False):
+    ensure_schema(driver)
+    build_road_connection_pairs(resume=resume)
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (r1:Road {osm_id: row.a}), (r2:Road {osm_id: row.b})
             MERGE (r1)-[:CONNECTS_TO]->(r2)
             MERGE (r2)-[:CONNECTS_TO]->(r1)
-        """, a=int(a), b=int(b))
+            """,
+            iter_pg_batches(pg, "SELECT a, b FROM road_connections"),
+            "Road connectivity",
+            to_row=lambda r: {"a": int(r[0]), "b": int(r[1])}
+        )
 
-    neo.close()
-    cur.close()
-    pg.close()
+    refresh_road_index(driver)
 
 def corrected_push_road_zone_links_to_neo4j():
     print("Pushing Road → Zone relationships into Neo4j")
+    ensure_schema(driver)
+
+    delete_in_batches(driver, "MATCH ()-[r:LOCATED_IN]->()", "r", detach=False)
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (r:Road {osm_id: row.road})
+            MATCH (z:Zone {zone_id: row.zone})
+            MERGE (r)-[:LOCATED_IN]->(z)
+            """,
+            iter_pg_batches(pg, "SELECT road_osm_id, zone_osm_id FROM road_zone_links;"),
+            "Road-Zone links",
+            to_row=lambda r: {"road": int(r[0]), "zone": int(r[1])}
+        )
 
-    pg = get_pg_conn()
-    cur = pg.cursor()
-
-    cur.execute("SELECT road_osm_id, zone_osm_id FROM road_zone_links;")
-    pairs = cur.fetchall()
-    print(f"Fetched {len(pairs)} Road–Zone pairs")
-    with driver.session() as session:
-        session.run("MATCH ()-[r:LOCATED_IN]->() DELETE r")
-
-        for road_id, zone_id in pairs:
-            session.run("""
-                MATCH (r:Road {osm_id: $road})
-                MATCH (z:Zone {zone_id: $zone})
-                MERGE (r)-[:LOCATED_IN]->(z)
-            """, road=int(road_id), zone=int(zone_id))
-
-    cur.close()
-    pg.close()
     print("Road → Zone relationships successfully written to Neo4j")
-    return {"status": "Neo4j updated", "links": len(pairs)}
+    return {"status": "Neo4j updated", "links": count}
 
 
 def push_road_zone_links_to_neo4j():
     print("Pushing Road → Zone relationships into Neo4j")
 
-    pg = get_pg_conn()
-    cur = pg.cursor()
-
-    cur.execute("SELECT road_osm_id, zone_osm_id FROM road_zone_links;")
-    pairs = cur.fetchall()
-    print(f"Fetched {len(pairs)} Road–Zone pairs")
-
-    with driver.session() as session:
-        session.run("MATCH ()-[r:LOCATED_IN]->() DELETE r")
-
-        for road_id, zone_id in pairs:
-            session.run("""
-                MATCH (r:Road {osm_id: $road})
-                MATCH (z:Zone {id: $zone})
-                MERGE (r)-[:LOCATED_IN]->(z)
-            """, road=str(road_id), zone=str(zone_id))
+    delete_in_batches(driver, "MATCH ()-[r:LOCATED_IN]->()", "r", detach=False)
+
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (r:Road {osm_id: row.road})
+            MATCH (z:Zone {id: row.zone})
+            MERGE (r)-[:LOCATED_IN]->(z)
+            """,
+            iter_pg_batches(pg, "SELECT road_osm_id, zone_osm_id FROM road_zone_links;"),
+            "Road-Zone links",
+            to_row=lambda r: {"road": str(r[0]), "zone": str(r[1])}
+        )
 
-    cur.close()
-    pg.close()
     driver.close()
 
     print("Road → Zone relationships successfully written to Neo4j")
-    return {"status": "Neo4j updated", "links": len(pairs)}
+    return {"status": "Neo4j updated", "links": count}
+
+StreamFormat = Literal["geojson", "ndjson"]
+
+STREAM_MEDIA_TYPES = {
+    "geojson": "application/geo+json",
+    "ndjson": "application/x-ndjson",
+}
+
+def _stream_response(sql, params, fmt: StreamFormat):
+    chunks = stream_features(sql, params, fmt=fmt)
+    # run the query before committing to a 200 so SQL errors still surface
+    first = next(chunks, "")
+    return StreamingResponse(chain([first], chunks), media_type=STREAM_MEDIA_TYPES[fmt])
+
+def _parse_bbox(bbox: Optional[str]):
+    if bbox is None:
+        return None
+    try:
+        parts = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be min_lon,min_lat,max_lon,max_lat")
+    return parts
 
 @app.get("/map/violations/construction-hospitals")
-def construction_hospital_violations():
+def construction_hospital_violations(
+    limit: int = 1000,
+    offset: int = 0,
+    bbox: Optional[str] = None,
+    severity: Optional[str] = None,
+    stream: Optional[StreamFormat] = None
+):
+    severities = [s.strip().upper() for s in severity.split(",")] if severity else None
+    if stream:
+        sql, params = violation_features_sql(bbox=_parse_bbox(bbox), severities=severities)
+        return _stream_response(sql, params, stream)
+
+    limit = max(1, min(limit, 5000))
+    offset = max(0, offset)
+    violations, total = detect_construction_hospital_violations(
+        limit=limit,
+        offset=offset,
+        bbox=_parse_bbox(bbox),
+        severities=severities
+    )
+
     return {
         "type": "FeatureCollection",
+        "total": total,
+        "limit": limit,
+        "offset": offset,
         "features": [
             {
                 "type": "Feature",
@@ -366,35 +587,55 @@ def construction_hospital_violations():
                     "risk_factor": v["risk_factor"]
                 }
             }
-            for v in detect_construction_hospital_violations()
+            for v in violations
         ]
     }
 
 @app.get("/map/hospital-buffers")
-def hospital_buffers_geojson():
-    conn = pg_conn
-    cur = conn.cursor()
-
-    cur.execute("""
-        SELECT jsonb_build_object(
-          'type', 'FeatureCollection',
-          'features', jsonb_agg(
-            jsonb_build_object(
-              'type', 'Feature',
-              'geometry', ST_AsGeoJSON(geom)::jsonb,
-              'properties', jsonb_build_object(
-                'hospital', hospital_name,
-                'buffer_type', buffer_type,
-                'distance', distance_m
-              )
-            )
-          )
-        )
-        FROM hospital_buffers;
-    """)
+def hospital_buffers_geojson(stream: Optional[StreamFormat] = None):
+    ensure_hospital_buffers()
+    feature = feature_sql("ST_AsGeoJSON(geom)", {
+        "hospital": "hospital_name",
+        "buffer_type": "buffer_type",
+        "distance": "distance_m",
+    })
+    sql = f"SELECT {feature} FROM {BUFFER_TABLE}"
+    if stream:
+        return _stream_response(sql, None, stream)
+
+    # already serialized by PostGIS; joined without a parse/dump round trip
+    return Response("".join(stream_features(sql)), media_type="application/json")
+
+
+class NearestRoadsRequest(BaseModel):
+    points: List[List[float]]
+    k: int = 1
+    exclude_ids: Optional[List[int]] = None
+
+@app.get("/api/nearest-road")
+def nearest_road(lat: float, lng: float, k: int = 1):
+    roads = nearest_roads([(lng, lat)], k=max(1, k))[0]
+    if not roads:
+        raise HTTPException(status_code=404, detail="No road found")
 
-    return cur.fetchone()[0]
+    return {
+        "road_id": roads[0][0],
+        "distance_m": roads[0][1],
+        "roads": [{"road_id": rid, "distance_m": d} for rid, d in roads]
+    }
 
+@app.post("/api/nearest-roads")
+def nearest_roads_batch(req: NearestRoadsRequest):
+    """
+    Snap many [lng, lat] points in one call.
+    """
+    results = nearest_roads(req.points, k=max(1, req.k), exclude_ids=req.exclude_ids)
+    return {
+        "results": [
+            [{"road_id": rid, "distance_m": d} for rid, d in roads]
+            for roads in results
+        ]
+    }
 
 @app.get("/api/impact/junction/{junction_id}")
 def junction_impact(junction_id: int):
@@ -442,7 +683,11 @@ def hospital_buffers(distance: int = 100):
     )
 
 @app.get("/map/highlight")
-def map_highlight(entity: str):
+def map_highlight(entity: str, stream: Optional[StreamFormat] = None):
+    if stream:
+        sql, params = highlight_features_sql(entity)
+        return _stream_response(sql, params, stream)
+
     features = fetch_geometries(entity)
 
     return {
@@ -450,114 +695,176 @@ def map_highlight(entity: str):
         "features": features
     }
 
+@app.get("/tiles/{layer}/{z}/{x}/{y}.mvt")
+def map_tile(layer: str, z: int, x: int, y: int, request: Request):
+    try:
+        tile, version = get_tile(layer, z, x, y)
+    except UnknownLayer:
+        raise HTTPException(status_code=404, detail=f"Unknown tile layer: {layer}")
+    except InvalidTile:
+        raise HTTPException(status_code=400, detail=f"Invalid tile coordinates: {z}/{x}/{y}")
+
+    etag = f'"{layer}-{version}-{z}-{x}-{y}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers=headers
+    )
+
 @app.post("/build/roads")
 def build_roads():
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT osm_id, name, highway, ST_Length(way::geography)
-        FROM planet_osm_roads
-        WHERE highway IS NOT NULL;
-    """)
-    roads = cur.fetchall()
+    ensure_schema(driver)
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (road:Road {id: row.id})
+            SET road.name = row.name,
+                road.type = row.type,
+                road.length = row.length
+            WITH road
+            MERGE (city:City {id: "ahmedabad"})
+            MERGE (road)-[:LOCATED_IN]->(city)
+            """,
+            iter_pg_batches(pg, """
+                SELECT osm_id, name, highway, ST_Length(way::geography)
+                FROM planet_osm_roads
+                WHERE highway IS NOT NULL;
+            """),
+            "Road nodes (/build/roads)",
+            to_row=lambda r: {"id": str(r[0]), "name": r[1], "type": r[2], "length": float(r[3])}
+        )
 
-    with driver.session(database="neo4j") as session:
-        for r in roads:
-            session.run("""
-                MERGE (road:Road {id: $id})
-                SET road.name = $name,
-                    road.type = $type,
-                    road.length = $length
-                MERGE (city:City {id: "ahmedabad"})
-                MERGE (road)-[:LOCATED_IN]->(city)
-            """, id=str(r[0]), name=r[1], type=r[2], length=float(r[3]))
-
-    return {"status": "Road nodes created", "count": len(roads)}
+    return {"status": "Road nodes created", "count": count}
 
 @app.post("/build/road-connections")
-def connect_roads():
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT r1.osm_id, r2.osm_id
-        FROM planet_osm_roads r1
-        JOIN planet_osm_roads r2
-        ON ST_Touches(r1.way, r2.way)
-        WHERE r1.osm_id <> r2.osm_id;
-    """)
-    pairs = cur.fetchall()
-
-    with driver.session(database="neo4j") as session:
-        for a, b in pairs:
-            session.run("""
-                MATCH (r1:Road {id: $a}), (r2:Road {id: $b})
-                MERGE (r1)-[:CONNECTS_TO]->(r2)
-            """, a=str(a), b=str(b))
+def connect_roads(resume: bool = False):
+    ensure_schema(driver)
+    build_road_connection_pairs(resume=resume)
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (r1:Road {id: row.a}), (r2:Road {id: row.b})
+            MERGE (r1)-[:CONNECTS_TO]->(r2)
+            """,
+            iter_pg_batches(pg, """
+                SELECT a, b FROM road_connections
+                UNION ALL
+                SELECT b, a FROM road_connections
+            """),
+            "Road connectivity (/build/road-connections)",
+            to_row=lambda r: {"a": str(r[0]), "b": str(r[1])}
+        )
 
-    return {"status": "Road connectivity created", "edges": len(pairs)}
+    refresh_road_index(driver)
+    return {"status": "Road connectivity created", "edges": count}
 
 @app.post("/build/zones")
 def build_zones():
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT osm_id, name, ST_Area(way::geography)
-        FROM planet_osm_polygon
-        WHERE boundary = 'administrative';
-    """)
-    zones = cur.fetchall()
-
-    with driver.session(database="neo4j") as session:
-        for z in zones:
-            session.run("""
-                MERGE (zone:Zone {id: $id})
-                SET zone.name = $name,
-                    zone.area = $area
-                MERGE (city:City {id: "ahmedabad"})
-                MERGE (zone)-[:PART_OF]->(city)
-            """, id=str(z[0]), name=z[1], area=float(z[2]))
+    ensure_schema(driver)
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (zone:Zone {id: row.id})
+            SET zone.name = row.name,
+                zone.area = row.area
+            WITH zone
+            MERGE (city:City {id: "ahmedabad"})
+            MERGE (zone)-[:PART_OF]->(city)
+            """,
+            iter_pg_batches(pg, """
+                SELECT osm_id, name, ST_Area(way::geography)
+                FROM planet_osm_polygon
+                WHERE boundary = 'administrative';
+            """),
+            "Zone nodes (/build/zones)",
+            to_row=lambda r: {"id": str(r[0]), "name": r[1], "area": float(r[2])}
+        )
 
-    return {"status": "Zones created", "count": len(zones)}
+    return {"status": "Zones created", "count": count}
 
 
 @app.post("/link_roads_to_zones")
 def link_roads_to_zones():
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT r.osm_id, z.osm_id
-        FROM planet_osm_roads r, planet_osm_polygon z
-        WHERE z.boundary = 'administrative'
-        AND ST_Intersects(r.way, z.way);
-    """)
-    pairs = cur.fetchall()
-
-    with driver.session(database="neo4j") as session:
-        for r, z in pairs:
-            session.run("""
-                MATCH (road:Road {id: $rid}), (zone:Zone {id: $zid})
-                MERGE (road)-[:LOCATED_IN]->(zone)
-            """, rid=str(r), zid=str(z))
+    ensure_schema(driver)
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MATCH (road:Road {id: row.rid}), (zone:Zone {id: row.zid})
+            MERGE (road)-[:LOCATED_IN]->(zone)
+            """,
+            iter_pg_batches(pg, """
+                SELECT r.osm_id, z.osm_id
+                FROM planet_osm_roads r, planet_osm_polygon z
+                WHERE z.boundary = 'administrative'
+                AND ST_Intersects(r.way, z.way);
+            """),
+            "Road-Zone links (/link_roads_to_zones)",
+            to_row=lambda r: {"rid": str(r[0]), "zid": str(r[1])}
+        )
 
-    return {"status": "Road-Zone links created", "edges": len(pairs)}
+    return {"status": "Road-Zone links created", "edges": count}
 
 
 @app.post("/build_hospitals")
 def build_hospitals():
-    cur = pg_conn.cursor()
-    cur.execute("""
-        SELECT osm_id, name, way
-        FROM planet_osm_point
-        WHERE amenity = 'hospital';
-    """)
-    hospitals = cur.fetchall()
+    ensure_schema(driver)
+    with pg_connection(statement_timeout_ms=0) as pg:
+        count = write_batches(
+            driver,
+            """
+            UNWIND $rows AS row
+            MERGE (hos:Hospital {id: row.id})
+            SET hos.name = row.name
+            WITH hos
+            MERGE (city:City {id: "ahmedabad"})
+            MERGE (hos)-[:LOCATED_IN]->(city)
+            """,
+            iter_pg_batches(pg, """
+                SELECT osm_id, name
+                FROM planet_osm_point
+                WHERE amenity = 'hospital';
+            """),
+            "Hospital nodes (/build_hospitals)",
+            to_row=lambda r: {"id": str(r[0]), "name": r[1]}
+        )
 
-    with driver.session(database="neo4j") as session:
-        for h in hospitals:
-            session.run("""
-                MERGE (hos:Hospital {id: $id})
-                SET hos.name = $name
-                MERGE (city:City {id: "ahmedabad"})
-                MERGE (hos)-[:LOCATED_IN]->(city)
-            """, id=str(h[0]), name=h[1])
+    return {"status": "Hospitals created", "count": count}
 
-    return {"status": "Hospitals created", "count": len(hospitals)}
+@app.post("/build/spatial-indexes")
+def build_spatial_indexes():
+    return {"created": ensure_projected_indexes()}
+
+@app.post("/build/snapshot")
+def build_graph_snapshot():
+    return rebuild_snapshot()
+
+@app.post("/build/hospital-roads")
+def build_hospital_roads():
+    result = build_hospital_road_table()
+    invalidate_spatial_cache()
+    return result
+
+@app.post("/build/hospital-buffers")
+def build_hospital_buffers(full: bool = False):
+    changed = refresh_hospital_buffers(full=full)
+    invalidate_spatial_cache()
+    return {"status": "Hospital buffers refreshed", "changed_hospitals": len(changed)}
+
+@app.post("/build/violations")
+def build_violations(full: bool = False):
+    return refresh_violations(full=full)
 
 @app.get("/impact/road/{road_id}")
 def road_impact(road_id: str, hops: int = 2):
@@ -584,104 +891,89 @@ def road_impact(road_id: str, hops: int = 2):
         }
     
 @app.get("/api/impact/semantic/{road_id}", response_model=ImpactSubgraphResponse)
-def semantic_impact(road_id: int, hops: int = 3):
-    with driver.session(database="neo4j") as neo:
-        query = """
-        MATCH (r:Road {osm_id: $road})
-        CALL apoc.path.spanningTree(r, {
-        relationshipFilter: "<CONNECTS_TO|CONNECTS_TO",
-        minLevel: 0,
-        maxLevel: $maxHops,
-        bfs: true
-        })
-        YIELD path
-        WITH last(nodes(path)) AS node, length(path) AS hop
-        RETURN node, hop
-"""
+def semantic_impact(
+    road_id: int,
+    hops: int = 3,
+    backend: Optional[ImpactBackend] = None,
+    zoom: Optional[int] = None
+):
+    if _use_memory_backend(backend):
+        affected = affected_roads_within(road_id, hops, "memory")
+        records = [
+            {"node": {"osm_id": rid}, "labels": ["Road"], "hop": hop}
+            for rid, hop in sorted(affected.items(), key=lambda x: x[1])
+        ]
+    else:
+        with driver.session(database="neo4j") as neo:
+            query = """
+            MATCH (r:Road {osm_id: $road})
+            CALL apoc.path.spanningTree(r, {
+            relationshipFilter: "<CONNECTS_TO|CONNECTS_TO",
+            minLevel: 0,
+            maxLevel: $maxHops,
+            bfs: true
+            })
+            YIELD path
+            WITH last(nodes(path)) AS node, length(path) AS hop
+            RETURN node, hop
+    """
+
+            records = [
+                {"node": r["node"], "labels": r["node"].labels, "hop": r["hop"]}
+                for r in neo.run(query, road=road_id, maxHops=hops)
+            ]
+
+    road_ids = [int(r["node"]["osm_id"]) for r in records if "Road" in r["labels"]]
+    hospital_ids = [r["node"]["id"] for r in records if "Hospital" in r["labels"]]
+    zone_ids = [r["node"]["id"] for r in records if "Zone" in r["labels"]]
+
+    road_geoms = fetch_geometries_by_ids("planet_osm_roads", "osm_id", road_ids, "way", zoom)
+    hospital_geoms = fetch_geometries_by_ids("hospitals", "id", hospital_ids, "geom", zoom)
+    zone_geoms = fetch_geometries_by_ids("zones", "id", zone_ids, "geom", zoom)
+
+    result = []
+
+    for record in records:
+        node = record["node"]
+        hop = record["hop"]
+
+        if "Road" in record["labels"]:
+            geom = road_geoms.get(int(node["osm_id"]))
+
+            result.append(GraphEntity(
+                id=str(node["osm_id"]),
+                type="Road",
+                hop=hop,
+                geometry=geom["coordinates"] if geom else None
+            ))
 
+        elif "Hospital" in record["labels"]:
+            pt = hospital_geoms.get(node["id"])
 
+            result.append(GraphEntity(
+                id=str(node["id"]),
+                type="Hospital",
+                hop=hop,
+                location=[pt["coordinates"][1], pt["coordinates"][0]] if pt else None
+            ))
 
+        elif "Zone" in record["labels"]:
+            poly = zone_geoms.get(node["id"])
 
-        records = neo.run(query, road=road_id, maxHops=hops)
-
-        pg = get_pg_conn()
-        pgcur = pg.cursor()
-
-        result = []
-
-        for record in records:
-            node = record["node"]
-            hop = record["hop"]
-
-            if "Road" in node.labels:
-                pgcur.execute(
-                    "SELECT ST_AsGeoJSON(way) FROM planet_osm_roads WHERE osm_id=%s",
-                    (int(node["osm_id"]),)
-                )
-                geom = pgcur.fetchone()
-                coords = json.loads(geom[0])["coordinates"] if geom else None
-
-                result.append(GraphEntity(
-                    id=str(node["osm_id"]),
-                    type="Road",
-                    hop=hop,
-                    geometry=coords
-                ))
-
-            elif "Hospital" in node.labels:
-                pgcur.execute(
-                    "SELECT ST_X(geom), ST_Y(geom) FROM hospitals WHERE id=%s",
-                    (node["id"],)
-                )
-                pt = pgcur.fetchone()
-
-                result.append(GraphEntity(
-                    id=str(node["id"]),
-                    type="Hospital",
-                    hop=hop,
-                    location=[pt[1], pt[0]] if pt else None
-                ))
-
-            elif "Zone" in node.labels:
-                pgcur.execute(
-                    "SELECT ST_AsGeoJSON(geom) FROM zones WHERE id=%s",
-                    (node["id"],)
-                )
-                poly = pgcur.fetchone()
-                poly_coords = json.loads(poly[0])["coordinates"] if poly else None
-
-                result.append(GraphEntity(
-                    id=str(node["id"]),
-                    type="Zone",
-                    hop=hop,
-                    geometry=poly_coords
-                ))
-
-        pgcur.close()
-        pg.close()
-
-        return ImpactSubgraphResponse(
-            root=str(road_id),
-            max_hops=hops,
-            subgraph=result
-        )
-    
-@app.get("/api/impact/zones/{road_id}")
-def zone_impact(road_id: int, hops: int = 3):
-    with driver.session(database="neo4j") as neo:
-        records = list(neo.run("""
-        MATCH (root:Road {osm_id: $road})
-        CALL apoc.path.spanningTree(
-          root,
-          {
-            relationshipFilter: "CONNECTS_TO",
-            minLevel: 0,
-            maxLevel: $hops,
-            bfs: true
-          }
-        )
-        YIELD path
-        WITH last(nodes(path)) AS r
+            result.append(GraphEntity(
+                id=str(node["id"]),
+                type="Zone",
+                hop=hop,
+                geometry=poly["coordinates"] if poly else None
+            ))
+
+    return ImpactSubgraphResponse(
+        root=str(road_id),
+        max_hops=hops,
+        subgraph=result
+    )
+
+ZONE_SEVERITY_CYPHER = """
         MATCH (r)-[:LOCATED_IN]->(z:Zone)
         WITH z, count(DISTINCT r) AS affected_roads
 
@@ -699,29 +991,40 @@ def zone_impact(road_id: int, hops: int = 3):
           total_roads,
           round(toFloat(affected_roads) / total_roads, 3) AS severity
         ORDER BY severity DESC
-        """, road=road_id, hops=hops))
-
-    pg = psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASS
+"""
+
+@app.get("/api/impact/zones/{road_id}")
+def zone_impact(
+    road_id: int,
+    hops: int = 3,
+    backend: Optional[ImpactBackend] = None,
+    zoom: Optional[int] = None
+):
+    affected = list(affected_roads_within(road_id, hops, backend))
+
+    snapshot = get_snapshot() if _use_memory_backend(backend) else None
+    if snapshot is not None:
+        records = snapshot.zone_severity(affected)
+    else:
+        with driver.session(database="neo4j") as neo:
+            records = list(neo.run("""
+            UNWIND $roads AS rid
+            MATCH (r:Road {osm_id: rid})
+            """ + ZONE_SEVERITY_CYPHER, roads=affected))
+
+    zone_geoms = fetch_geometries_by_ids(
+        "planet_osm_polygon",
+        "name",
+        {r["zone_name"] for r in records},
+        "way",
+        zoom,
+        where="boundary = 'administrative'"
     )
-    cur = pg.cursor()
 
     zones = []
 
     for r in records:
-        cur.execute("""
-            SELECT ST_AsGeoJSON(way)
-            FROM planet_osm_polygon
-            WHERE name = %s
-              AND boundary = 'administrative'
-            LIMIT 1
-        """, (r["zone_name"],))
-
-        geom = cur.fetchone()
+        geom = zone_geoms.get(r["zone_name"])
         if not geom:
             continue
 
@@ -731,12 +1034,9 @@ def zone_impact(road_id: int, hops: int = 3):
             "affected_roads": r["affected_roads"],
             "total_roads": r["total_roads"],
             "severity": float(r["severity"]),
-            "geometry": json.loads(geom[0])["coordinates"]
+            "geometry": geom["coordinates"]
         })
 
-    cur.close()
-    pg.close()
-
     return {
         "road_id": road_id,
         "hops": hops,
@@ -745,111 +1045,56 @@ def zone_impact(road_id: int, hops: int = 3):
 
 
 @app.get("/api/impact/hospitals/{road_id}")
-def hospital_impact(road_id: int, hops: int = 3):
-    # 1️⃣ Neo4j BFS
-    with driver.session(database="neo4j") as neo:
-        records = neo.run("""
-        MATCH (root:Road {osm_id: $road})
-        CALL apoc.path.spanningTree(
-          root,
-          {
-            relationshipFilter: "CONNECTS_TO",
-            minLevel: 0,
-            maxLevel: $hops,
-            bfs: true
-          }
-        )
-        YIELD path
-        WITH last(nodes(path)) AS r, length(path) AS hop
-        RETURN r.osm_id AS road_id, hop
-        """, road=road_id, hops=hops)
+def hospital_impact(road_id: int, hops: int = 3, backend: Optional[ImpactBackend] = None):
+    # 1️⃣ Road network BFS
+    affected_roads = affected_roads_within(road_id, hops, backend)
 
-        affected_roads = {
-            r["road_id"]: r["hop"]
-            for r in records
-        }
+    # 2️⃣ Precomputed hospital → nearest road
+    affected_hospitals = [
+        h for h in get_hospital_roads()
+        if h["roads"] and h["roads"][0] in affected_roads
+    ]
 
-    # 2️⃣ PostGIS hospital → nearest road
-    pg = psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASS
-    )
-    cur = pg.cursor()
-
-    cur.execute("""
-        SELECT
-          h.osm_id,
-          h.name,
-          ST_Y(h.way) AS lat,
-          ST_X(h.way) AS lon,
-          r.osm_id AS road_id
-        FROM planet_osm_point h
-        JOIN LATERAL (
-          SELECT osm_id
-          FROM planet_osm_roads
-          ORDER BY h.way <-> planet_osm_roads.way
-          LIMIT 1
-        ) r ON true
-        WHERE h.amenity = 'hospital'
-    """)
+    # Find alternative safe roads, all hospitals at once
+    alternatives = nearest_unaffected_roads(affected_hospitals, affected_roads.keys())
 
     hospitals = []
 
-    for hid, name, lat, lon, road in cur.fetchall():
-        if road in affected_roads:
-            hop = affected_roads[road]
-
-            if hop == 0:
-                risk = "CRITICAL"
-                reason = "Hospital is directly connected to the failed road. Immediate access disruption expected."
-            elif hop == 1:
-                risk = "HIGH"
-                reason = "Hospital access roads are directly connected to the failed road."
-            elif hop == 2:
-                risk = "MEDIUM"
-                reason = "Hospital is reachable only via secondary roads affected by the failure."
-            else:
-                risk = "LOW"
-                reason = "Hospital is indirectly affected with alternative routes still available."
-
-            # Find alternative safe road
-            cur.execute("""
-                SELECT osm_id
-                FROM planet_osm_roads
-                WHERE osm_id NOT IN %s
-                ORDER BY way <-> ST_SetSRID(ST_Point(%s, %s), 4326)
-                LIMIT 1
-            """, (
-                tuple(affected_roads.keys()),
-                lon,
-                lat
-            ))
-            alt = cur.fetchone()
-
-            if alt:
-                alt_road = alt[0]
-                reroute = {
-                    "suggested_road_id": alt_road,
-                    "reason": "Nearest unaffected road providing alternative access"
-                }
-            else:
-                reroute = None
-
-            hospitals.append({
-                "hospital_id": hid,
-                "name": name,
-                "location": [lat, lon],
-                "hop": hop,
-                "risk": risk,
-                "reason": reason,
-                "reroute": reroute
-            })
-
-    cur.close()
-    pg.close()
+    for h in affected_hospitals:
+        hop = affected_roads[h["roads"][0]]
+
+        if hop == 0:
+            risk = "CRITICAL"
+            reason = "Hospital is directly connected to the failed road. Immediate access disruption expected."
+        elif hop == 1:
+            risk = "HIGH"
+            reason = "Hospital access roads are directly connected to the failed road."
+        elif hop == 2:
+            risk = "MEDIUM"
+            reason = "Hospital is reachable only via secondary roads affected by the failure."
+        else:
+            risk = "LOW"
+            reason = "Hospital is indirectly affected with alternative routes still available."
+
+        alt_road = alternatives.get(h["hospital_id"])
+
+        if alt_road is not None:
+            reroute = {
+                "suggested_road_id": alt_road,
+                "reason": "Nearest unaffected road providing alternative access"
+            }
+        else:
+            reroute = None
+
+        hospitals.append({
+            "hospital_id": h["hospital_id"],
+            "name": h["name"],
+            "location": [h["lat"], h["lon"]],
+            "hop": hop,
+            "risk": risk,
+            "reason": reason,
+            "reroute": reroute
+        })
 
     hospitals.sort(key=lambda x: x["hop"])
 
@@ -860,54 +1105,14 @@ def hospital_impact(road_id: int, hops: int = 3):
     }
 
 @app.get("/api/impact/summary/{road_id}")
-def impact_summary(road_id: int, hops: int = 3):
+def impact_summary(road_id: int, hops: int = 3, backend: Optional[ImpactBackend] = None):
     # reuse hospital logic
-    with driver.session(database="neo4j") as neo:
-        records = neo.run("""
-        MATCH (root:Road {osm_id: $road})
-        CALL apoc.path.spanningTree(
-          root,
-          {
-            relationshipFilter: "CONNECTS_TO",
-            minLevel: 0,
-            maxLevel: $hops,
-            bfs: true
-          }
-        )
-        YIELD path
-        WITH last(nodes(path)) AS r, length(path) AS hop
-        RETURN r.osm_id AS road_id, hop
-        """, road=road_id, hops=hops)
-
-        affected_roads = {r["road_id"]: r["hop"] for r in records}
-
-    pg = psycopg2.connect(
-        host=PG_HOST,
-        port=PG_PORT,
-        database=PG_DB,
-        user=PG_USER,
-        password=PG_PASS
-    )
-    cur = pg.cursor()
-
-    cur.execute("""
-        SELECT
-          h.osm_id,
-          h.name,
-          r.osm_id AS road_id
-        FROM planet_osm_point h
-        JOIN LATERAL (
-          SELECT osm_id
-          FROM planet_osm_roads
-          ORDER BY h.way <-> planet_osm_roads.way
-          LIMIT 1
-        ) r ON true
-        WHERE h.amenity = 'hospital'
-    """)
+    affected_roads = affected_roads_within(road_id, hops, backend)
 
     hospitals = []
 
-    for hid, name, road in cur.fetchall():
+    for h in get_hospital_roads():
+        road = h["roads"][0] if h["roads"] else None
         if road in affected_roads:
             hop = affected_roads[road]
             score = max(0, (hops + 1) - hop)  # higher = more critical
@@ -920,15 +1125,12 @@ def impact_summary(road_id: int, hops: int = 3):
                 explanation = "Indirect dependency via secondary routes"
 
             hospitals.append({
-                "name": name,
+                "name": h["name"],
                 "hop": hop,
                 "priority_score": score,
                 "explanation": explanation
             })
 
-    cur.close()
-    pg.close()
-
     hospitals.sort(key=lambda x: (-x["priority_score"], x["hop"]))
 
     return {
@@ -937,21 +1139,55 @@ def impact_summary(road_id: int, hops: int = 3):
     }
 
 @app.post("/rag/ingest")
-def ingest_documents():
-    return ingest_pdfs("docs")
+def ingest_documents(full: bool = False):
+    return ingest_pdfs("docs", full=full)
 
 @app.get("/api/health")
 def health():
     return {"status": "AI Engine running"}
 
+@app.get("/api/metrics")
+def metrics():
+    return {
+        "postgis_pool": pool_stats(),
+        "caches": cache_stats()
+    }
+
 @app.post("/rag/query", response_model=RagAnswer)
-def query_documents(question: str):
-    return rag_query(question)
+async def query_documents(question: str, debug: bool = False):
+    return await rag_query_async(question, debug=debug)
+
+RagStreamFormat = Literal["sse", "ndjson"]
+
+@app.api_route("/rag/query/stream", methods=["GET", "POST"])
+async def query_documents_stream(question: str, stream: RagStreamFormat = "sse", debug: bool = False):
+    """
+    Citations and grounding as soon as they are known, then the answer
+    token by token. GET is there for EventSource clients.
+    """
+    async def events():
+        async for event, data in rag_query_stream(question, debug=debug):
+            if stream == "sse":
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            else:
+                yield json.dumps({"event": event, "data": data}, default=str) + "\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if stream == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 
 if __name__ == "__main__":
     print("Rebuilding road connectivity from PostGIS...")
+    ensure_projected_indexes()
     build_road_zone_links()
     build_road_connectivity_from_postgis()
+    build_hospital_road_table()
+    refresh_hospital_buffers()
+    refresh_violations()
+    invalidate_spatial_cache()
+    rebuild_snapshot()
     print("Done.")
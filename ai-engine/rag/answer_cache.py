@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from cache import register_stats
+from rag.embedding_cache import normalize
+from rag.embeddings import embed_texts
+from rag.lexical_index import get_lexical_index, tokenize
+
+RAG_ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", 512))
+RAG_ANSWER_CACHE_TTL_S = float(os.getenv("RAG_ANSWER_CACHE_TTL_S", 1800))
+# cosine similarity above which two questions count as paraphrases
+RAG_ANSWER_CACHE_SIMILARITY = float(os.getenv("RAG_ANSWER_CACHE_SIMILARITY", 0.93))
+
+
+def _literals(question):
+    # clause numbers, distances and zone codes must match exactly
+    return frozenset(t for t in tokenize(question) if any(ch.isdigit() for ch in t))
+
+
+class AnswerCache:
+    """
+    LRU of answered questions with a time to live, keyed by normalized
+    text. A miss on the exact key falls back to the most similar cached
+    question embedding; answers are tagged with the corpus version they
+    were generated from and never served for another one.
+    """
+
+    def __init__(self, maxsize=RAG_ANSWER_CACHE_SIZE, ttl=RAG_ANSWER_CACHE_TTL_S,
+                 threshold=RAG_ANSWER_CACHE_SIMILARITY):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        # key -> (unit vector, literals, answer, corpus version, expires)
+        self._entries = OrderedDict()
+        self._matrix = None
+        self._matrix_keys = []
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _live(self, key, version, now):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[4] < now or entry[3] != version:
+            del self._entries[key]
+            self._matrix = None
+            return None
+        return entry
+
+    def _semantic_match(self, vector, literals, version, now):
+        if self._matrix is None:
+            self._matrix_keys = list(self._entries)
+            self._matrix = (
+                np.vstack([self._entries[k][0] for k in self._matrix_keys])
+                if self._matrix_keys else np.zeros((0, len(vector)), dtype=np.float32)
+            )
+
+        similarity = self._matrix @ vector
+        for i in np.argsort(-similarity):
+            if similarity[i] < self.threshold:
+                break
+            key = self._matrix_keys[i]
+            entry = self._live(key, version, now)
+            if entry is not None and entry[1] == literals:
+                return key, entry, float(similarity[i])
+        return None
+
+    def lookup(self, question, vector, version):
+        """
+        (answer, "exact" | "semantic", similarity) or None.
+        """
+        key = normalize(question)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._live(key, version, now)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry[2], "exact", 1.0
+
+            match = self._semantic_match(vector, _literals(question), version, now)
+            if match is not None:
+                key, entry, similarity = match
+                self._entries.move_to_end(key)
+                self.semantic_hits += 1
+                return entry[2], "semantic", similarity
+
+            self.misses += 1
+            return None
+
+    def store(self, question, vector, answer, version):
+        key = normalize(question)
+        with self._lock:
+            self._entries[key] = (
+                vector, _literals(question), answer, version, time.monotonic() + self.ttl
+            )
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            hits = self.exact_hits + self.semantic_hits
+            return {
+                "size": len(self._entries),
+                "max_size": self.maxsize,
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+_cache = AnswerCache()
+register_stats("rag_answers", _cache.stats)
+
+
+def corpus_version():
+    index = get_lexical_index()
+    return index.version if index is not None else ""
+
+
+def question_vector(question):
+    """
+    Unit-length question embedding; goes through the embedding cache, so
+    retrieval reuses it.
+    """
+    vector = embed_texts([question])[0]
+    return vector / (np.linalg.norm(vector) or 1.0)
+
+
+def get_cached_answer(question, vector):
+    return _cache.lookup(question, vector, corpus_version())
+
+
+def cache_answer(question, vector, answer):
+    _cache.store(question, vector, answer, corpus_version())
+
+
+def invalidate_answer_cache():
+    _cache.clear()
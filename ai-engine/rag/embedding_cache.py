@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from cache import TTLCache, register_stats
+
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "/data/embed_cache")
+EMBED_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBED_CACHE_MEMORY_ENTRIES", 4096))
+EMBED_CACHE_DISK_ENTRIES = int(os.getenv("EMBED_CACHE_DISK_ENTRIES", 131072))
+
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def cache_key(model_name: str, text: str) -> int:
+    digest = hashlib.sha1(f"{model_name}\0{normalize(text)}".encode("utf-8")).digest()
+    # 0 marks an empty slot on disk
+    return int.from_bytes(digest[:8], "little") or 1
+
+
+def _slot_checksum(key, vector):
+    h = hashlib.blake2b(int(key).to_bytes(8, "little"), digest_size=8)
+    h.update(np.ascontiguousarray(vector, dtype=np.float32).tobytes())
+    return int.from_bytes(h.digest(), "little")
+
+
+class DiskEmbeddingCache:
+    """
+    Direct-mapped on-disk tier: a (capacity, dim) float32 memmap of
+    vectors plus uint64 memmaps of the key stored in each slot and a
+    checksum of (key, vector). A key lives in slot key % capacity and a
+    colliding write evicts it, so the files never grow. Other processes
+    may overwrite a slot while it is being read; a read whose copied
+    vector does not match the checksum is treated as a miss.
+    """
+
+    def __init__(self, directory, capacity, dim, model_name):
+        self.directory = directory
+        self.capacity = capacity
+        self.dim = dim
+
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        keys_path = os.path.join(directory, "keys.u64")
+        vectors_path = os.path.join(directory, "vectors.f32")
+        checks_path = os.path.join(directory, "checks.u64")
+
+        meta = {"model": model_name, "dim": dim, "capacity": capacity, "format": 2}
+        fresh = True
+        if all(os.path.exists(p) for p in (meta_path, keys_path, vectors_path, checks_path)):
+            with open(meta_path) as f:
+                fresh = json.load(f) != meta
+
+        mode = "w+" if fresh else "r+"
+        self._keys = np.memmap(keys_path, dtype=np.uint64, mode=mode, shape=(capacity,))
+        self._vectors = np.memmap(vectors_path, dtype=np.float32, mode=mode, shape=(capacity, dim))
+        self._checks = np.memmap(checks_path, dtype=np.uint64, mode=mode, shape=(capacity,))
+
+        if fresh:
+            with open(meta_path, "w") as f:
+                json.dump(meta, f)
+
+    def get(self, key):
+        slot = key % self.capacity
+        if int(self._keys[slot]) != key:
+            return None
+        vector = np.array(self._vectors[slot])
+        # a concurrent write for another key leaves a mismatch here
+        if int(self._checks[slot]) != _slot_checksum(key, vector) or int(self._keys[slot]) != key:
+            return None
+        return vector
+
+    def put(self, key, vector):
+        slot = key % self.capacity
+        vector = np.asarray(vector, dtype=np.float32)
+        self._keys[slot] = 0
+        self._vectors[slot] = vector
+        self._checks[slot] = _slot_checksum(key, vector)
+        self._keys[slot] = key
+
+    def flush(self):
+        self._vectors.flush()
+        self._checks.flush()
+        self._keys.flush()
+
+
+class EmbeddingCache:
+    """
+    Embedding cache keyed by (model name, normalized text): an in-process
+    LRU in front of the memory-mapped disk tier, which survives restarts.
+    """
+
+    def __init__(self, model_name, directory=EMBED_CACHE_DIR,
+                 memory_entries=EMBED_CACHE_MEMORY_ENTRIES, disk_entries=EMBED_CACHE_DISK_ENTRIES):
+        self.model_name = model_name
+        self.directory = directory
+        self.disk_entries = disk_entries
+        self._memory = TTLCache(memory_entries)
+        self._disk = None
+        self._disk_failed = False
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _disk_tier(self, dim=None):
+        if self._disk is not None or self._disk_failed:
+            return self._disk
+
+        meta_path = os.path.join(self.directory, "meta.json")
+        if dim is None and os.path.exists(meta_path):
+            with open(meta_path) as f:
+                dim = json.load(f).get("dim")
+        if dim is None:
+            return None
+
+        try:
+            self._disk = DiskEmbeddingCache(self.directory, self.disk_entries, dim, self.model_name)
+        except OSError as e:
+            print(f"Embedding disk cache disabled: {e}")
+            self._disk_failed = True
+        return self._disk
+
+    def get_many(self, texts):
+        """
+        Return (vectors, missing) where vectors[i] is None for texts that
+        have to be embedded and missing lists their positions.
+        """
+        keys = [cache_key(self.model_name, t) for t in texts]
+        vectors = [None] * len(texts)
+        missing = []
+
+        with self._lock:
+            disk = self._disk_tier()
+            for i, key in enumerate(keys):
+                v = self._memory.get(key)
+                if v is not None:
+                    self.memory_hits += 1
+                elif disk is not None and (v := disk.get(key)) is not None:
+                    self._memory.set(key, v)
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+                    missing.append(i)
+                vectors[i] = v
+
+        return vectors, missing
+
+    def put_many(self, texts, vectors):
+        with self._lock:
+            disk = self._disk_tier(dim=len(vectors[0])) if len(vectors) else None
+            for text, vector in zip(texts, vectors):
+                key = cache_key(self.model_name, text)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._memory.set(key, vector)
+                if disk is not None:
+                    disk.put(key, vector)
+            if disk is not None:
+                disk.flush()
+
+    def stats(self):
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_size": len(self._memory),
+            "memory_max_size": self._memory.maxsize,
+            "disk_max_size": self.disk_entries,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+        }
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name):
+    with _caches_lock:
+        if model_name not in _caches:
+            _caches[model_name] = EmbeddingCache(model_name)
+            register_stats(f"embeddings:{model_name}", _caches[model_name].stats)
+        return _caches[model_name]
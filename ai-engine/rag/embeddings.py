@@ -1,14 +1,51 @@
+import numpy as np
 from sentence_transformers import SentenceTransformer
+from rag.embedding_cache import get_embedding_cache, normalize
+
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
 
 _model = None
 
 def get_embedding_model():
     global _model
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        _model = SentenceTransformer(EMBEDDING_MODEL)
     return _model
 
 
-def embed_texts(texts):
-    model = get_embedding_model()
-    return model.encode(texts, show_progress_bar=True)
+def embed_texts(texts, batch_size=64, show_progress_bar=False, use_cache=True):
+    """
+    Embed texts with MiniLM. Query-time callers go through the embedding
+    cache so only unseen (normalized) texts reach the model; bulk document
+    ingestion passes use_cache=False to keep chunks out of it.
+    """
+    texts = list(texts)
+
+    if not use_cache:
+        return get_embedding_model().encode(
+            texts,
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar
+        )
+
+    cache = get_embedding_cache(EMBEDDING_MODEL)
+    vectors, missing = cache.get_many(texts)
+
+    if missing:
+        # texts that normalize alike are encoded once
+        unique = {}
+        for i in missing:
+            unique.setdefault(normalize(texts[i]), texts[i])
+        new = get_embedding_model().encode(
+            list(unique.values()),
+            batch_size=batch_size,
+            show_progress_bar=show_progress_bar
+        )
+        cache.put_many(list(unique.values()), new)
+        encoded = dict(zip(unique, new))
+        for i in missing:
+            vectors[i] = encoded[normalize(texts[i])]
+
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.vstack(vectors).astype(np.float32)
@@ -1,14 +1,76 @@
-from google import genai
-import os
 import json
+import os
+import re
+import threading
 
-def extract_entities(question: str) -> dict:
+from graph.neo4j_client import Neo4jClient
+from rag.gazetteer import build_gazetteer
+from rag.llm import GEMINI_MODEL, get_genai_client
+
+# below this the question goes to Gemini
+ENTITY_CONFIDENCE_THRESHOLD = float(os.getenv("ENTITY_CONFIDENCE_THRESHOLD", 0.5))
+
+# names, codes and acronyms the gazetteer might not know
+CANDIDATE_RE = re.compile(r"\b(?:[A-Z]{2,}[A-Z0-9-]*|[A-Z][a-z]+)\b")
+
+_gazetteer = None
+_lock = threading.Lock()
+
+
+def _neo4j_labels():
+    try:
+        neo4j = Neo4jClient()
+        try:
+            return [r["label"] for r in neo4j.query("CALL db.labels() YIELD label RETURN label")]
+        finally:
+            neo4j.close()
+    except Exception as e:
+        print(f"Neo4j labels unavailable for the gazetteer: {e}")
+        return []
+
+
+def get_gazetteer():
+    global _gazetteer
+    if _gazetteer is None:
+        with _lock:
+            if _gazetteer is None:
+                _gazetteer = build_gazetteer(_neo4j_labels())
+    return _gazetteer
+
+
+def reset_gazetteer():
+    """
+    Rebuild on next use, after ingest has harvested new document terms.
     """
-    Extract city-planning entities from user question.
+    global _gazetteer
+    _gazetteer = None
+
+
+def extract_entities_local(question: str):
     """
+    (entities, confidence) from the gazetteer. Confidence is the share of
+    likely entity mentions (matches plus unmatched capitalized words and
+    codes past the first word) that the gazetteer recognised.
+    """
+    matches = get_gazetteer().find(question)
+
+    entities = {}
+    for _, _, entity_type, canonical in matches:
+        values = entities.setdefault(entity_type, [])
+        if canonical not in values:
+            values.append(canonical)
+
+    if not matches:
+        return entities, 0.0
+
+    unknown = sum(
+        1 for m in CANDIDATE_RE.finditer(question)
+        if m.start() > 0 and not any(s <= m.start() < e for s, e, _, _ in matches)
+    )
+    return entities, len(matches) / (len(matches) + unknown)
 
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
+def _extract_with_llm(question: str) -> dict:
     prompt = f"""
 Extract planning-related entities from the question.
 
@@ -31,8 +93,8 @@ Example output:
 }}
 """
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
+    response = get_genai_client().models.generate_content(
+        model=GEMINI_MODEL,
         contents=prompt
     )
 
@@ -40,3 +102,20 @@ Example output:
         return json.loads(response.text)
     except Exception:
         return {}
+
+
+def extract_entities(question: str) -> dict:
+    """
+    Extract city-planning entities from user question. The gazetteer
+    answers in-process; Gemini is only asked when it is unsure, and its
+    answer falls back to the local one.
+    """
+    entities, confidence = extract_entities_local(question)
+    if confidence >= ENTITY_CONFIDENCE_THRESHOLD:
+        return entities
+
+    try:
+        return _extract_with_llm(question) or entities
+    except Exception as e:
+        print(f"LLM entity extraction failed: {e}")
+        return entities
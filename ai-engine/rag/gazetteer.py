@@ -0,0 +1,236 @@
+import json
+import os
+import re
+from collections import deque
+
+from rag.vector_store import QDRANT_COLLECTION, QDRANT_PATH
+
+# planning terms harvested from the documents at ingest
+GAZETTEER_PATH = os.getenv(
+    "GAZETTEER_PATH", os.path.join(QDRANT_PATH, f"{QDRANT_COLLECTION}.gazetteer.json")
+)
+
+# surface form -> canonical value, per entity type
+SEED_TERMS = {
+    "building_type": {
+        "hospital": "hospital",
+        "health facility": "hospital",
+        "nursing home": "hospital",
+        "dispensary": "hospital",
+        "clinic": "hospital",
+        "school": "school",
+        "college": "college",
+        "university": "college",
+        "educational institution": "school",
+        "residential building": "residential building",
+        "commercial building": "commercial building",
+        "high rise building": "high rise building",
+        "high-rise building": "high rise building",
+        "institutional building": "institutional building",
+        "place of worship": "place of worship",
+        "temple": "place of worship",
+        "court": "court",
+    },
+    "infrastructure": {
+        "road": "road",
+        "street": "road",
+        "highway": "road",
+        "arterial road": "road",
+        "link road": "road",
+        "flyover": "flyover",
+        "bridge": "bridge",
+        "junction": "junction",
+        "intersection": "junction",
+        "metro": "metro",
+        "brts": "brts",
+        "railway": "railway",
+        "footpath": "footpath",
+        "parking": "parking",
+        "drainage": "drainage",
+    },
+    "land_use": {
+        "residential": "residential",
+        "commercial": "commercial",
+        "industrial": "industrial",
+        "agricultural": "agricultural",
+        "mixed use": "mixed use",
+        "green belt": "green belt",
+        "open space": "open space",
+        "recreational": "recreational",
+        "zone": "zone",
+    },
+    "regulation_concept": {
+        "buffer zone": "buffer zone",
+        "buffer": "buffer zone",
+        "silence zone": "silence zone",
+        "setback": "setback",
+        "margin": "margin",
+        "fsi": "floor space index",
+        "floor space index": "floor space index",
+        "floor area ratio": "floor area ratio",
+        "ground coverage": "ground coverage",
+        "building height": "building height",
+        "height restriction": "building height",
+        "right of way": "right of way",
+        "development control": "development control",
+        "construction restriction": "construction restriction",
+        "noise": "noise",
+        "night-time construction": "construction restriction",
+        "permission": "development permission",
+        "gdcr": "gdcr",
+    },
+}
+
+# Neo4j labels that name planning entities
+LABEL_TYPES = {
+    "Hospital": "building_type",
+    "Road": "infrastructure",
+    "Junction": "infrastructure",
+    "Zone": "land_use",
+    "ConstructionProject": "regulation_concept",
+}
+
+# "Floor Space Index (FSI)"
+ACRONYM_RE = re.compile(r"\b([A-Z][a-z]+(?:[ -][A-Za-z][a-z]+){1,5})\s*\(([A-Z]{2,6})\)")
+# acronyms that are also everyday words would match ordinary questions
+AMBIGUOUS_ACRONYMS = {"far", "use", "row", "all", "act", "net", "per", "via", "its"}
+
+# "Residential Zone", "Mixed Use Zone"
+ZONE_RE = re.compile(r"\b((?:[A-Z][a-z]+ ){1,2})Zone\b")
+
+
+def _plurals(term):
+    if term.endswith("y") and not term.endswith(("ay", "ey", "oy")):
+        return [term[:-1] + "ies"]
+    if term.endswith(("s", "x", "ch", "sh")):
+        return [term + "es"]
+    return [term + "s"]
+
+
+def harvest_terms(texts):
+    """
+    {surface: [entity_type, canonical]} for defined acronyms and named
+    zones in the document chunks.
+    """
+    terms = {}
+    for text in texts:
+        for long_form, acronym in ACRONYM_RE.findall(text):
+            # keep the trailing words whose initials spell the acronym
+            words = re.split(r"[ -]", long_form)[-len(acronym):]
+            if "".join(w[0] for w in words).upper() != acronym:
+                continue
+            canonical = " ".join(words).lower()
+            terms[canonical] = ["regulation_concept", canonical]
+            if acronym.lower() not in AMBIGUOUS_ACRONYMS:
+                terms[acronym.lower()] = ["regulation_concept", canonical]
+        for name in ZONE_RE.findall(text):
+            canonical = name.strip().lower()
+            terms[canonical + " zone"] = ["land_use", canonical]
+    return terms
+
+
+def write_harvested_terms(texts, path=GAZETTEER_PATH):
+    terms = harvest_terms(texts)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"terms": terms}, f)
+    os.replace(tmp, path)
+    return len(terms)
+
+
+def load_harvested_terms(path=GAZETTEER_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get("terms", {})
+
+
+class Gazetteer:
+    """
+    Aho-Corasick automaton over lowercased surface forms. One pass over
+    the text finds every occurrence; matches must sit on word boundaries
+    and overlapping ones resolve leftmost-longest.
+    """
+
+    def __init__(self, terms):
+        # terms: {surface: (entity_type, canonical)}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]
+
+        for surface, value in terms.items():
+            state = 0
+            for ch in surface:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append((len(surface), value[0], value[1]))
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+        self.size = len(terms)
+
+    def find(self, text):
+        """
+        [(start, end, entity_type, canonical)] in text order.
+        """
+        text = text.lower()
+        found = []
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(ch, 0)
+            for length, entity_type, canonical in self._out[state]:
+                start, end = i - length + 1, i + 1
+                if (start == 0 or not text[start - 1].isalnum()) and \
+                        (end == len(text) or not text[end].isalnum()):
+                    found.append((start, end, entity_type, canonical))
+
+        found.sort(key=lambda m: (m[0], m[0] - m[1]))
+        matches = []
+        covered = 0
+        for m in found:
+            if m[0] >= covered:
+                matches.append(m)
+                covered = m[1]
+        return matches
+
+
+def build_gazetteer(labels=()):
+    """
+    Seed vocabulary (with plurals), document terms and Neo4j labels.
+    """
+    terms = {}
+    for entity_type, surfaces in SEED_TERMS.items():
+        for surface, canonical in surfaces.items():
+            for form in [surface] + _plurals(surface):
+                terms[form] = (entity_type, canonical)
+
+    for surface, (entity_type, canonical) in load_harvested_terms().items():
+        terms.setdefault(surface, (entity_type, canonical))
+
+    for label in labels:
+        entity_type = LABEL_TYPES.get(label)
+        if entity_type is None:
+            continue
+        words = re.sub(r"(?<=[a-z])(?=[A-Z])", " ", label).lower()
+        for form in [words] + _plurals(words):
+            terms.setdefault(form, (entity_type, words))
+
+    return Gazetteer(terms)
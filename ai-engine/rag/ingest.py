@@ -1,56 +1,93 @@
+import hashlib
 import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from qdrant_client import QdrantClient
-from qdrant_client.models import PointStruct, VectorParams, Distance
+from qdrant_client.models import (
+    Distance,
+    PointIdsList,
+    PointStruct,
+    VectorParams,
+)
+from rag.answer_cache import invalidate_answer_cache
 from rag.embeddings import embed_texts
+from rag.entity_extractor import reset_gazetteer
+from rag.gazetteer import write_harvested_terms
+from rag.lexical_index import get_lexical_index, rebuild_lexical_index, scroll_chunk_texts
+from rag.vector_store import QDRANT_COLLECTION, get_qdrant_client
 
-QDRANT_COLLECTION = "city_docs"
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", 256))
+INGEST_UPSERT_BATCH = int(os.getenv("INGEST_UPSERT_BATCH", 512))
 
-def ingest_pdfs(pdf_dir="docs"):
-    client = QdrantClient(path="/data/vector")
+# namespace for chunk point ids, so the same chunk always gets the same id
+CHUNK_NAMESPACE = uuid.UUID("8b0f6a52-3f0e-4d6c-9a57-6c1f1e3e4b21")
 
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def chunk_id(document, page, text):
+    chunk_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    return str(uuid.uuid5(CHUNK_NAMESPACE, f"{document}:{page}:{chunk_hash}")), chunk_hash
+
+
+def _parse_pdf(path):
+    """
+    Load and split one PDF. Runs in a worker process.
+    """
     splitter = RecursiveCharacterTextSplitter(
         chunk_size=800,
         chunk_overlap=150
     )
+    docs = PyPDFLoader(path).load()
+    return [
+        (c.metadata.get("page", -1), c.page_content)
+        for c in splitter.split_documents(docs)
+    ]
+
+
+def _collection_exists(client):
+    return any(
+        c.name == QDRANT_COLLECTION
+        for c in client.get_collections().collections
+    )
 
-    points = []
-    point_id = 0
-
-    for file in os.listdir(pdf_dir):
-        if not file.lower().endswith(".pdf"):
-            continue
-
-        loader = PyPDFLoader(os.path.join(pdf_dir, file))
-        docs = loader.load()
-
-        chunks = splitter.split_documents(docs)
-        if not chunks:
-            continue
-
-        texts = [c.page_content for c in chunks]
-        vectors = embed_texts(texts)
-
-        for chunk, vector in zip(chunks, vectors):
-            points.append(
-                PointStruct(
-                    id=point_id,
-                    vector=vector.tolist(),
-                    payload={
-                        "document": file,
-                        "page": chunk.metadata.get("page", -1),
-                        "text": chunk.page_content
-                    }
-                )
-            )
-            point_id += 1
 
-    if not points:
-        return {"documents": 0, "chunks": 0}
+def _indexed_state(client):
+    """
+    {document: (file_hash, set of point ids)} for what is already stored;
+    empty when the collection does not exist yet.
+    """
+    state = {}
+    if not _collection_exists(client):
+        return state
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=QDRANT_COLLECTION,
+            with_payload=["document", "file_hash"],
+            with_vectors=False,
+            limit=1024,
+            offset=offset
+        )
+        for p in points:
+            doc = p.payload.get("document")
+            _, ids = state.setdefault(doc, (p.payload.get("file_hash"), set()))
+            ids.add(str(p.id))
+        if offset is None:
+            return state
+
 
-    # ✅ correct attribute access
-    vector_size = len(points[0].vector)
+def _ensure_collection(client, vector_size):
+    if _collection_exists(client):
+        return
 
     client.recreate_collection(
         collection_name=QDRANT_COLLECTION,
@@ -60,12 +97,131 @@ def ingest_pdfs(pdf_dir="docs"):
         )
     )
 
-    client.upsert(
-        collection_name=QDRANT_COLLECTION,
-        points=points
-    )
+
+def _delete_points(client, ids):
+    ids = list(ids)
+    for i in range(0, len(ids), INGEST_UPSERT_BATCH):
+        client.delete(
+            collection_name=QDRANT_COLLECTION,
+            points_selector=PointIdsList(points=ids[i:i + INGEST_UPSERT_BATCH])
+        )
+
+
+def _embed_and_upsert(client, chunks):
+    """
+    Embed (id, payload) chunks in large batches and upsert them in bounded
+    slices, so memory stays flat however many chunks there are.
+    """
+    for i in range(0, len(chunks), INGEST_EMBED_BATCH):
+        batch = chunks[i:i + INGEST_EMBED_BATCH]
+        vectors = embed_texts(
+            [payload["text"] for _, payload in batch],
+            batch_size=INGEST_EMBED_BATCH,
+            use_cache=False
+        )
+        if i == 0:
+            _ensure_collection(client, len(vectors[0]))
+
+        points = [
+            PointStruct(id=pid, vector=v.tolist(), payload=payload)
+            for (pid, payload), v in zip(batch, vectors)
+        ]
+        for j in range(0, len(points), INGEST_UPSERT_BATCH):
+            client.upsert(
+                collection_name=QDRANT_COLLECTION,
+                points=points[j:j + INGEST_UPSERT_BATCH]
+            )
+
+
+def ingest_pdfs(pdf_dir="docs", full=False):
+    """
+    Incrementally sync docs/ into Qdrant. Files are content-hashed and
+    chunks get ids derived from their hash, so only new or changed chunks
+    are embedded and chunks of edited or deleted files are removed.
+    full=True drops the collection and re-embeds everything.
+    """
+    client = get_qdrant_client()
+
+    if full:
+        client.delete_collection(collection_name=QDRANT_COLLECTION)
+
+    indexed = _indexed_state(client)
+
+    files = {
+        file: os.path.join(pdf_dir, file)
+        for file in sorted(os.listdir(pdf_dir))
+        if file.lower().endswith(".pdf")
+    }
+    hashes = {file: file_hash(path) for file, path in files.items()}
+
+    changed = [f for f in files if indexed.get(f, (None,))[0] != hashes[f]]
+    removed = [doc for doc in indexed if doc not in files]
+
+    stale_ids = set()
+    for doc in removed:
+        stale_ids |= indexed[doc][1]
+
+    added = 0
+    total_chunks = 0
+    with ProcessPoolExecutor(max_workers=max(1, min(INGEST_WORKERS, len(changed) or 1))) as pool:
+        parsed = pool.map(_parse_pdf, [files[f] for f in changed])
+
+        for file, pieces in zip(changed, parsed):
+            known = indexed.get(file, (None, set()))[1]
+            new_chunks = {}
+
+            for page, text in pieces:
+                pid, chunk_hash = chunk_id(file, page, text)
+                if pid in known or pid in new_chunks:
+                    continue
+                new_chunks[pid] = {
+                    "document": file,
+                    "page": page,
+                    "text": text,
+                    "file_hash": hashes[file],
+                    "chunk_hash": chunk_hash
+                }
+
+            current_ids = {chunk_id(file, page, text)[0] for page, text in pieces}
+            stale_ids |= known - current_ids
+
+            _embed_and_upsert(client, list(new_chunks.items()))
+
+            # unchanged chunks keep their vectors; only re-stamp the file hash
+            kept = list(known & current_ids)
+            for i in range(0, len(kept), INGEST_UPSERT_BATCH):
+                client.set_payload(
+                    collection_name=QDRANT_COLLECTION,
+                    payload={"file_hash": hashes[file]},
+                    points=kept[i:i + INGEST_UPSERT_BATCH]
+                )
+
+            added += len(new_chunks)
+            total_chunks += len(current_ids)
+
+    if stale_ids:
+        _delete_points(client, stale_ids)
+
+    for file in files:
+        if file not in changed:
+            total_chunks += len(indexed[file][1])
+
+    # BM25 side of hybrid retrieval and the entity gazetteer's document
+    # terms, both rebuilt from the stored payloads
+    lexical_rebuilt = bool(changed or removed or full) or get_lexical_index() is None
+    if lexical_rebuilt:
+        ids, texts = scroll_chunk_texts(client)
+        rebuild_lexical_index(ids, texts)
+        write_harvested_terms(texts)
+        reset_gazetteer()
+        invalidate_answer_cache()
 
     return {
-        "documents": len(set(p.payload["document"] for p in points)),
-        "chunks": len(points)
+        "documents": len(files),
+        "chunks": total_chunks,
+        "changed_documents": len(changed),
+        "removed_documents": len(removed),
+        "embedded_chunks": added,
+        "deleted_chunks": len(stale_ids),
+        "lexical_index_rebuilt": lexical_rebuilt
     }
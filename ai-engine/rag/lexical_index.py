@@ -0,0 +1,229 @@
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+
+import numpy as np
+
+from rag.vector_store import QDRANT_COLLECTION, QDRANT_PATH
+
+# stored next to the Qdrant collection it mirrors
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH", os.path.join(QDRANT_PATH, f"{QDRANT_COLLECTION}.bm25.npz")
+)
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# clause numbers (13.2.1), zone codes (R-1, GH/2) and plain words
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "of", "on", "or", "shall", "that", "the", "this", "to", "was", "what",
+    "when", "which", "with",
+}
+
+
+def tokenize(text):
+    """
+    Lowercased terms; compound tokens like "13.2.1" or "r-1" are kept
+    whole and also contribute their parts.
+    """
+    terms = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(p for p in re.split(r"[./-]", token) if len(p) > 1 and p not in STOPWORDS)
+    return terms
+
+
+def corpus_version(ids):
+    return hashlib.sha1("\n".join(sorted(ids)).encode("utf-8")).hexdigest()[:16]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over the ingested chunks. Postings are a CSR over
+    the sorted vocabulary: doc_indices/term_freqs for terms[i] live in
+    indptr[i]:indptr[i + 1]. Documents are Qdrant point ids.
+    """
+
+    def __init__(self, terms, indptr, doc_indices, term_freqs, doc_ids, doc_lengths, version):
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_indices = doc_indices
+        self.term_freqs = term_freqs
+        self.doc_ids = doc_ids
+        self.doc_lengths = doc_lengths
+        self.version = version
+
+        avgdl = float(doc_lengths.mean()) if len(doc_lengths) else 1.0
+        self._norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(avgdl, 1.0))
+
+    @classmethod
+    def build(cls, ids, texts):
+        vocab = {}
+        term_rows, doc_rows, tf_rows = [], [], []
+        doc_lengths = np.zeros(len(texts), dtype=np.int32)
+
+        for d, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            doc_lengths[d] = sum(counts.values())
+            for term, tf in counts.items():
+                term_rows.append(vocab.setdefault(term, len(vocab)))
+                doc_rows.append(d)
+                tf_rows.append(tf)
+
+        terms = np.array(sorted(vocab), dtype=str)
+        remap = np.zeros(len(vocab), dtype=np.int64)
+        for term, i in vocab.items():
+            remap[i] = np.searchsorted(terms, term)
+
+        term_rows = remap[np.asarray(term_rows, dtype=np.int64)]
+        doc_rows = np.asarray(doc_rows, dtype=np.int32)
+        order = np.lexsort((doc_rows, term_rows))
+
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_rows, minlength=len(terms)), out=indptr[1:])
+
+        ids = [str(i) for i in ids]
+        return cls(
+            terms,
+            indptr,
+            doc_rows[order],
+            np.asarray(tf_rows, dtype=np.float32)[order],
+            np.array(ids, dtype=str),
+            doc_lengths,
+            corpus_version(ids)
+        )
+
+    @property
+    def document_count(self):
+        return len(self.doc_ids)
+
+    def search(self, query, limit=20):
+        """
+        [(point_id, bm25_score)] for the best `limit` chunks, best first.
+        """
+        n = self.document_count
+        terms = np.array(sorted(set(tokenize(query))), dtype=str)
+        if n == 0 or len(terms) == 0 or len(self.terms) == 0:
+            return []
+
+        pos = np.searchsorted(self.terms, terms).clip(max=len(self.terms) - 1)
+        pos = pos[self.terms[pos] == terms]
+
+        scores = np.zeros(n, dtype=np.float32)
+        for p in pos:
+            start, end = self.indptr[p], self.indptr[p + 1]
+            docs = self.doc_indices[start:end]
+            tf = self.term_freqs[start:end]
+            df = end - start
+            idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + self._norm[docs])
+
+        hits = np.nonzero(scores)[0]
+        if len(hits) > limit:
+            hits = hits[np.argpartition(-scores[hits], limit - 1)[:limit]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(str(self.doc_ids[d]), float(scores[d])) for d in hits]
+
+
+def write_lexical_index(index, path=LEXICAL_INDEX_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp.npz"
+    np.savez(
+        tmp,
+        terms=index.terms,
+        indptr=index.indptr,
+        doc_indices=index.doc_indices,
+        term_freqs=index.term_freqs,
+        doc_ids=index.doc_ids,
+        doc_lengths=index.doc_lengths,
+        version=np.array(index.version)
+    )
+    os.replace(tmp, path)
+
+
+def load_lexical_index(path=LEXICAL_INDEX_PATH):
+    """
+    The stored index, or None if ingest has not written one yet.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as f:
+        return LexicalIndex(
+            f["terms"], f["indptr"], f["doc_indices"], f["term_freqs"],
+            f["doc_ids"], f["doc_lengths"], str(f["version"])
+        )
+
+
+def scroll_chunk_texts(client):
+    """
+    (point ids, chunk texts) for everything stored in Qdrant.
+    """
+    ids, texts = [], []
+    if not any(c.name == QDRANT_COLLECTION for c in client.get_collections().collections):
+        return ids, texts
+
+    offset = None
+    while True:
+        points, offset = client.scroll(
+            collection_name=QDRANT_COLLECTION,
+            with_payload=["text"],
+            with_vectors=False,
+            limit=1024,
+            offset=offset
+        )
+        for p in points:
+            ids.append(str(p.id))
+            texts.append(p.payload.get("text", ""))
+        if offset is None:
+            return ids, texts
+
+
+_index = None
+_stamp = False  # file stamp of the loaded index; False before any load
+_lock = threading.Lock()
+
+
+def _file_stamp(path=LEXICAL_INDEX_PATH):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def rebuild_lexical_index(ids, texts):
+    """
+    Re-index the given chunks (all of Qdrant, see scroll_chunk_texts)
+    and swap the index in.
+    """
+    global _index, _stamp
+    index = LexicalIndex.build(ids, texts)
+    write_lexical_index(index)
+
+    with _lock:
+        _index, _stamp = index, _file_stamp()
+    print(f"Lexical index built: {index.document_count} chunks, {len(index.terms)} terms")
+    return index
+
+
+def get_lexical_index():
+    """
+    The stored index, reloaded when another process has written a new
+    one since it was loaded.
+    """
+    global _index, _stamp
+    stamp = _file_stamp()
+    if stamp != _stamp:
+        with _lock:
+            if stamp != _stamp:
+                _index = load_lexical_index()
+                _stamp = stamp
+    return _index
@@ -0,0 +1,22 @@
+import os
+import threading
+
+from google import genai
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_genai_client():
+    """
+    One Gemini client per process, so its HTTP connections are reused
+    across requests instead of being set up for every call.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    return _client
@@ -1,42 +1,36 @@
+import asyncio
+import threading
+import time
 from rag.entity_extractor import extract_entities
 from rag.query_expander import expand_query
 from rag.retriever import retrieve_chunks
+from rag.reranker import select_context
+from rag.answer_cache import cache_answer, get_cached_answer, question_vector
 from graph.entity_resolver import resolve_entities
 from spatial.spatial_analyzer import analyze_road_hospital_proximity
 from rag.schemas import RagAnswer, Citation
-from google import genai
+from rag.llm import GEMINI_MODEL, get_genai_client
 import os
 
-def rag_query(question: str) -> RagAnswer:
-    # 1️⃣ Entity extraction
-    entities = extract_entities(question)
-
-    # 2️⃣ Neo4j grounding
-    graph_entities = resolve_entities(entities)
-
-    # 3️⃣ Spatial grounding (PostGIS)
-    spatial_relations = analyze_road_hospital_proximity(max_distance_m=200)
-
-    # 2️⃣ Expand question
-    expanded_queries = expand_query(question, entities)
+RAG_STAGE_TIMEOUT_S = float(os.getenv("RAG_STAGE_TIMEOUT_S", 20))
+RAG_GENERATION_TIMEOUT_S = float(os.getenv("RAG_GENERATION_TIMEOUT_S", 60))
+# retrieved chunks the reranker chooses the prompt context from
+RAG_RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", 30))
+# context size if reranking fails
+RAG_FALLBACK_CHUNKS = 8
 
-    # 3️⃣ Retrieve relevant chunks
-    hits = retrieve_chunks(expanded_queries)
+NOT_FOUND = "Not found in provided documents."
 
-    if not hits:
-        return RagAnswer(
-            question=question,
-            answer="Not found in provided documents.",
-            citations=[]
-        )
 
-    # 4️⃣ Build context
-    context = "\n\n".join(
+def _build_context(hits):
+    return "\n\n".join(
         f"[{h.payload['document']} | page {h.payload['page']}]\n{h.payload['text']}"
         for h in hits
     )
 
-    prompt = f"""
+
+def _build_prompt(question, context):
+    return f"""
 You are a city planning regulation expert.
 
 Use the context below to answer the question.
@@ -50,16 +44,33 @@ Question:
 {question}
 """
 
-    client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
 
-    response = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=prompt
+def _generate_answer(question, hits):
+    response = get_genai_client().models.generate_content(
+        model=GEMINI_MODEL,
+        contents=_build_prompt(question, _build_context(hits))
     )
 
-    answer = response.text or "Not found in provided documents."
+    return response.text or NOT_FOUND
 
-    citations = [
+
+def _stream_answer(question, hits, put, cancelled):
+    """
+    Runs in a worker thread: hands each Gemini stream chunk to put().
+    """
+    stream = get_genai_client().models.generate_content_stream(
+        model=GEMINI_MODEL,
+        contents=_build_prompt(question, _build_context(hits))
+    )
+    for chunk in stream:
+        if cancelled.is_set():
+            break
+        if chunk.text:
+            put(chunk.text)
+
+
+def _citations(hits):
+    return [
         Citation(
             document=h.payload["document"],
             page=h.payload["page"],
@@ -68,10 +79,309 @@ Question:
         for h in hits
     ]
 
-    return RagAnswer(
+
+def _cache_lookup(question):
+    vector = question_vector(question)
+    return vector, get_cached_answer(question, vector)
+
+
+def _cached_response(hit, debug_info=None):
+    answer, match, similarity = hit
+    return answer.model_copy(update={
+        "cached": True,
+        "debug": dict(debug_info, cache=match, similarity=round(similarity, 4)) if debug_info is not None else None
+    })
+
+
+def rag_query(question: str) -> RagAnswer:
+    vector, hit = _cache_lookup(question)
+    if hit is not None:
+        return _cached_response(hit)
+
+    # 1️⃣ Entity extraction
+    entities = extract_entities(question)
+
+    # 2️⃣ Neo4j grounding
+    graph_entities = resolve_entities(entities)
+
+    # 3️⃣ Spatial grounding (PostGIS)
+    spatial_relations = analyze_road_hospital_proximity(max_distance_m=200)
+
+    # 2️⃣ Expand question
+    expanded_queries = expand_query(question, entities)
+
+    # 3️⃣ Retrieve relevant chunks, rerank them into the token budget
+    hits = retrieve_chunks(expanded_queries, RAG_RERANK_CANDIDATES, with_vectors=True)
+    hits, _ = select_context(question, hits, vector)
+
+    if not hits:
+        return RagAnswer(
+            question=question,
+            answer=NOT_FOUND,
+            citations=[]
+        )
+
+    # 4️⃣ Generate answer from context
+    answer = _generate_answer(question, hits)
+
+    result = RagAnswer(
         question=question,
         answer=answer,
-        citations=citations,
+        citations=_citations(hits),
         graph_entities=graph_entities,
         spatial_relations=spatial_relations
     )
+    cache_answer(question, vector, result)
+    return result
+
+
+class _StageRunner:
+    """
+    Runs blocking pipeline stages in worker threads with a timeout,
+    recording each stage's latency and turning failures into defaults.
+    """
+
+    def __init__(self):
+        self.timings_ms = {}
+        self.errors = {}
+
+    async def run(self, name, fn, *args, default=None, timeout=RAG_STAGE_TIMEOUT_S):
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(fn, *args), timeout)
+        except asyncio.TimeoutError:
+            self.errors[name] = f"timed out after {timeout}s"
+        except Exception as e:
+            self.errors[name] = f"{type(e).__name__}: {e}"
+        finally:
+            self.timings_ms[name] = round(1000 * (time.perf_counter() - started), 1)
+        return default
+
+
+async def rag_query_async(question: str, debug: bool = False) -> RagAnswer:
+    """
+    Same pipeline as rag_query, with independent stages run concurrently:
+    spatial grounding starts immediately, and graph grounding runs
+    alongside retrieval once entities are known. A failed or slow stage
+    yields an empty partial result instead of failing the request.
+    Answered and near-identical questions are served from the answer
+    cache; partial answers are not cached.
+    """
+    started = time.perf_counter()
+    stages = _StageRunner()
+
+    vector, hit = await stages.run("answer_cache", _cache_lookup, question, default=(None, None))
+    if hit is not None:
+        return _cached_response(hit, {
+            "stages_ms": stages.timings_ms,
+            "total_ms": round(1000 * (time.perf_counter() - started), 1),
+            "errors": stages.errors
+        } if debug else None)
+
+    spatial_task = asyncio.create_task(
+        stages.run("spatial_grounding", analyze_road_hospital_proximity, 200, default=[])
+    )
+
+    entities = await stages.run("entity_extraction", extract_entities, question, default={})
+
+    graph_task = asyncio.create_task(
+        stages.run("graph_grounding", resolve_entities, entities, default={})
+    )
+
+    expanded_queries = expand_query(question, entities)
+    hits = await stages.run(
+        "retrieval", retrieve_chunks, expanded_queries, RAG_RERANK_CANDIDATES, True, default=[]
+    )
+    hits, context_stats = await stages.run(
+        "rerank", select_context, question, hits, vector,
+        default=(hits[:RAG_FALLBACK_CHUNKS], None)
+    )
+
+    graph_entities, spatial_relations = await asyncio.gather(graph_task, spatial_task)
+
+    if hits:
+        answer = await stages.run(
+            "generation", _generate_answer, question, hits,
+            default=None, timeout=RAG_GENERATION_TIMEOUT_S
+        )
+        if answer is None:
+            answer = "Answer generation failed; see the cited sections."
+    else:
+        answer = NOT_FOUND
+
+    result = RagAnswer(
+        question=question,
+        answer=answer,
+        citations=_citations(hits),
+        graph_entities=graph_entities,
+        spatial_relations=spatial_relations
+    )
+    if vector is not None and not stages.errors:
+        cache_answer(question, vector, result)
+
+    if debug:
+        result = result.model_copy(update={"debug": {
+            "stages_ms": stages.timings_ms,
+            "total_ms": round(1000 * (time.perf_counter() - started), 1),
+            "errors": stages.errors,
+            "context": context_stats
+        }})
+    return result
+
+
+async def rag_query_stream(question: str, debug: bool = False):
+    """
+    Streaming rag_query_async, yielding (event, data) pairs as they become
+    available: citations once retrieval finishes, graph_entities and
+    spatial_relations whenever those stages finish (before citations if
+    they are faster), answer tokens as Gemini streams them, then done.
+    The assembled answer is cached like a regular one.
+    """
+    started = time.perf_counter()
+    stages = _StageRunner()
+
+    def done(cached, first_token_ms=None, **extra):
+        if not debug:
+            return {"cached": cached}
+        return {"cached": cached, "debug": {
+            "stages_ms": stages.timings_ms,
+            "first_token_ms": first_token_ms,
+            "total_ms": round(1000 * (time.perf_counter() - started), 1),
+            "errors": stages.errors,
+            **extra
+        }}
+
+    vector, hit = await stages.run("answer_cache", _cache_lookup, question, default=(None, None))
+    if hit is not None:
+        answer, match, similarity = hit
+        yield "citations", [c.model_dump() for c in answer.citations]
+        yield "graph_entities", answer.graph_entities
+        yield "spatial_relations", answer.spatial_relations
+        first_token_ms = round(1000 * (time.perf_counter() - started), 1)
+        yield "token", answer.answer
+        yield "done", done(True, first_token_ms, cache=match, similarity=round(similarity, 4))
+        return
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def put(event):
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def forward(name, stage):
+        events.put_nowait((name, await stage))
+
+    # the loop only holds weak references to tasks
+    tasks = []
+
+    async def run_answer():
+        """
+        Entities, retrieval and generation in order, reporting through the
+        queue so grounding events are passed on while this runs.
+        """
+        try:
+            entities = await stages.run("entity_extraction", extract_entities, question, default={})
+            tasks.append(asyncio.create_task(forward(
+                "graph_entities", stages.run("graph_grounding", resolve_entities, entities, default={})
+            )))
+
+            expanded_queries = expand_query(question, entities)
+            hits = await stages.run(
+                "retrieval", retrieve_chunks, expanded_queries, RAG_RERANK_CANDIDATES, True, default=[]
+            )
+            hits, context_stats = await stages.run(
+                "rerank", select_context, question, hits, vector,
+                default=(hits[:RAG_FALLBACK_CHUNKS], None)
+            )
+            events.put_nowait(("citations", (hits, context_stats)))
+            if not hits:
+                return
+
+            events.put_nowait(("generation_started", None))
+            generation_started = time.perf_counter()
+            try:
+                await asyncio.to_thread(
+                    _stream_answer, question, hits, lambda text: put(("token", text)), cancelled
+                )
+            except Exception as e:
+                stages.errors["generation"] = f"{type(e).__name__}: {e}"
+            finally:
+                stages.timings_ms["generation"] = round(1000 * (time.perf_counter() - generation_started), 1)
+        finally:
+            # tokens are queued before the thread's completion, so
+            # answer_done always comes after the last one
+            put(("answer_done", None))
+
+    tasks.append(asyncio.create_task(forward(
+        "spatial_relations",
+        stages.run("spatial_grounding", analyze_road_hospital_proximity, 200, default=[])
+    )))
+    tasks.append(asyncio.create_task(run_answer()))
+
+    hits, citations, context_stats = [], [], None
+    grounding = {}
+    tokens = []
+    first_token_ms = None
+    # the generation timeout bounds the wait for the first chunk and the
+    # gaps between chunks, not the length of the answer
+    last_output = None
+    remaining = {"graph_entities", "spatial_relations", "answer_done"}
+    try:
+        while remaining:
+            timeout = None
+            if last_output is not None and "answer_done" in remaining:
+                timeout = max(0.0, last_output + RAG_GENERATION_TIMEOUT_S - time.perf_counter())
+            try:
+                name, data = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                stages.errors["generation"] = f"no output for {RAG_GENERATION_TIMEOUT_S}s"
+                cancelled.set()
+                remaining.discard("answer_done")
+                last_output = None
+                continue
+
+            if name == "token":
+                if "answer_done" not in remaining:
+                    continue  # generation already gave up on
+                if first_token_ms is None:
+                    first_token_ms = round(1000 * (time.perf_counter() - started), 1)
+                last_output = time.perf_counter()
+                tokens.append(data)
+                yield "token", data
+            elif name == "generation_started":
+                last_output = time.perf_counter()
+            elif name == "citations":
+                hits, context_stats = data
+                citations = _citations(hits)
+                yield "citations", [c.model_dump() for c in citations]
+            elif name in remaining:
+                remaining.discard(name)
+                if name != "answer_done":
+                    grounding[name] = data
+                    yield name, data
+    finally:
+        cancelled.set()
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+    if not hits:
+        tokens.append(NOT_FOUND)
+        yield "token", NOT_FOUND
+    elif not tokens:
+        failed = "generation" in stages.errors
+        text = "Answer generation failed; see the cited sections." if failed else NOT_FOUND
+        tokens.append(text)
+        yield "token", text
+
+    if vector is not None and not stages.errors:
+        cache_answer(question, vector, RagAnswer(
+            question=question,
+            answer="".join(tokens),
+            citations=citations,
+            graph_entities=grounding.get("graph_entities", {}),
+            spatial_relations=grounding.get("spatial_relations", [])
+        ))
+
+    yield "done", done(False, first_token_ms, context=context_stats)
@@ -1,25 +1,23 @@
+import os
+
+# the question plus at most this many - 1 rewrites; BM25 covers exact terms
+RAG_MAX_QUERIES = int(os.getenv("RAG_MAX_QUERIES", 3))
+
+
 def expand_query(question: str, entities: dict) -> list[str]:
     """
     Convert natural question into regulation-style search queries.
+    The question itself always comes first.
     """
 
     expanded = [question]
 
     if "building_type" in entities:
         for b in entities["building_type"]:
-            expanded.extend([
-                f"{b} buffer zone regulations",
-                f"{b} land use restrictions",
-                f"{b} institutional building norms",
-                f"{b} silence zone rules"
-            ])
+            expanded.append(f"{b} buffer zone land use restrictions silence zone rules")
 
     if "infrastructure" in entities:
         for i in entities["infrastructure"]:
-            expanded.extend([
-                f"{i} construction regulations",
-                f"{i} development control rules",
-                f"{i} right of way norms"
-            ])
+            expanded.append(f"{i} construction development control right of way norms")
 
-    return list(set(expanded))
+    return list(dict.fromkeys(expanded))[:RAG_MAX_QUERIES]
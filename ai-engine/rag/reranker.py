@@ -0,0 +1,194 @@
+import os
+import threading
+
+import numpy as np
+
+from cache import register_stats
+from rag.answer_cache import question_vector
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 2500))
+# relevance vs. novelty in MMR; 1.0 is plain relevance order
+RAG_MMR_LAMBDA = float(os.getenv("RAG_MMR_LAMBDA", 0.7))
+
+# chunks this similar to one already picked add nothing
+DUPLICATE_SIMILARITY = 0.97
+# the splitter overlaps neighbouring chunks by up to 150 characters
+MERGE_MIN_OVERLAP = 20
+MERGE_MAX_OVERLAP = 400
+
+_encoding = None
+_encoding_failed = False
+
+_totals = {"queries": 0, "candidate_tokens": 0, "context_tokens": 0, "tokens_saved": 0}
+_totals_lock = threading.Lock()
+
+
+def count_tokens(text):
+    """
+    cl100k token count, or a 4-characters-per-token estimate when
+    tiktoken or its encoding file is unavailable.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            _encoding_failed = True
+            print(f"tiktoken unavailable, estimating context tokens: {e}")
+    if _encoding is None:
+        return max(1, len(text) // 4)
+    return len(_encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text, budget):
+    """
+    Leading part of text that fits in `budget` tokens (same counting as
+    count_tokens).
+    """
+    if count_tokens(text) <= budget:
+        return text
+    if _encoding is None:
+        return text[:max(1, budget) * 4]
+    return _encoding.decode(_encoding.encode(text, disallowed_special=())[:budget])
+
+
+class ContextBlock:
+    """
+    Text from one page that goes into the prompt, shaped like a Qdrant
+    hit (payload with document, page, text).
+    """
+
+    def __init__(self, document, page, text, score):
+        self.payload = {"document": document, "page": page, "text": text}
+        self.score = score
+
+
+def mmr_select(query, vectors, tokens, budget, lam=RAG_MMR_LAMBDA):
+    """
+    Positions picked by maximal marginal relevance, in pick order, until
+    the token budget is spent. The first pick is always kept (the caller
+    truncates it if it alone exceeds the budget); later chunks that do
+    not fit are skipped so that smaller ones further down can still be
+    used.
+    """
+    relevance = vectors @ query
+    redundancy = np.zeros(len(vectors), dtype=np.float32)
+    open_ = np.ones(len(vectors), dtype=bool)
+
+    selected = []
+    used = 0
+    while open_.any():
+        score = np.where(open_, lam * relevance - (1 - lam) * redundancy, -np.inf)
+        i = int(np.argmax(score))
+        open_[i] = False
+        if selected and used + tokens[i] > budget:
+            continue
+        if selected and redundancy[i] >= DUPLICATE_SIMILARITY:
+            continue
+        selected.append(i)
+        used += min(tokens[i], budget)
+        redundancy = np.maximum(redundancy, vectors @ vectors[i])
+    return selected
+
+
+def _overlap(a, b):
+    for k in range(min(len(a), len(b), MERGE_MAX_OVERLAP), MERGE_MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+def merge_page_texts(texts):
+    """
+    Stitch chunks of one page back together where one's tail is the
+    next one's head; pieces that do not touch stay separate.
+    """
+    pieces = list(texts)
+    merged = True
+    while merged and len(pieces) > 1:
+        merged = False
+        for i in range(len(pieces)):
+            for j in range(len(pieces)):
+                if i == j:
+                    continue
+                k = _overlap(pieces[i], pieces[j])
+                if k:
+                    pieces[i] = pieces[i] + pieces[j][k:]
+                    del pieces[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return pieces
+
+
+def select_context(question, hits, vector=None, budget=RAG_CONTEXT_TOKEN_BUDGET):
+    """
+    Rerank retrieved hits with MMR over their stored embeddings, keep what
+    fits in `budget` tokens and merge chunks from the same page. Returns
+    (blocks, stats) with stats comparing against sending every hit.
+    """
+    if not hits:
+        return [], {"candidates": 0, "selected": 0, "blocks": 0,
+                    "candidate_tokens": 0, "context_tokens": 0, "tokens_saved": 0}
+
+    tokens = np.array([count_tokens(h.payload["text"]) for h in hits])
+
+    if all(h.vector is not None for h in hits):
+        if vector is None:
+            vector = question_vector(question)
+        vectors = np.asarray([h.vector for h in hits], dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-9)
+        order = mmr_select(np.asarray(vector, dtype=np.float32), vectors, tokens, budget)
+    else:
+        # no embeddings to compare: keep retrieval order under the budget,
+        # always including the first hit
+        rest = budget - min(int(tokens[0]), budget)
+        order = [0] + [int(i) + 1 for i in np.nonzero(np.cumsum(tokens[1:]) <= rest)[0]]
+
+    # a lone chunk larger than the whole budget is cut down to it
+    texts = {i: hits[i].payload["text"] for i in order}
+    if tokens[order[0]] > budget:
+        texts[order[0]] = truncate_to_tokens(texts[order[0]], budget)
+
+    pages = {}
+    for i in order:
+        h = hits[i]
+        key = (h.payload["document"], h.payload["page"])
+        pages.setdefault(key, []).append(i)
+
+    blocks = []
+    for (document, page), members in pages.items():
+        text = "\n...\n".join(merge_page_texts(texts[i] for i in members))
+        blocks.append(ContextBlock(document, page, text, max(hits[i].score for i in members)))
+
+    candidate_tokens = int(tokens.sum())
+    context_tokens = sum(count_tokens(b.payload["text"]) for b in blocks)
+    stats = {
+        "candidates": len(hits),
+        "selected": len(order),
+        "blocks": len(blocks),
+        "candidate_tokens": candidate_tokens,
+        "context_tokens": context_tokens,
+        "tokens_saved": candidate_tokens - context_tokens,
+    }
+
+    with _totals_lock:
+        _totals["queries"] += 1
+        for field in ("candidate_tokens", "context_tokens", "tokens_saved"):
+            _totals[field] += stats[field]
+
+    return blocks, stats
+
+
+def context_stats():
+    with _totals_lock:
+        return dict(_totals)
+
+
+register_stats("rag_context", context_stats)
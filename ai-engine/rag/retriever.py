@@ -1,25 +1,84 @@
-from qdrant_client import QdrantClient
+import os
+
+from qdrant_client.models import ScoredPoint, SearchRequest
 from rag.embeddings import embed_texts
+from rag.lexical_index import get_lexical_index
+from rag.vector_store import QDRANT_COLLECTION, get_qdrant_client
 
-QDRANT_COLLECTION = "city_docs"
+# how deep each ranking goes before fusion
+RAG_FUSION_DEPTH = int(os.getenv("RAG_FUSION_DEPTH", 20))
+RRF_K = 60
 
-def retrieve_chunks(queries: list[str], limit=8):
-    client = QdrantClient(path="/data/vector")
 
-    all_hits = []
+def _vector_ranking(client, queries, depth, with_vectors=False):
+    # one forward pass for every expanded query
+    vectors = embed_texts(list(queries))
 
-    for q in queries:
-        vector = embed_texts([q])[0]
+    results = client.search_batch(
+        collection_name=QDRANT_COLLECTION,
+        requests=[
+            SearchRequest(vector=v.tolist(), limit=depth, with_payload=True, with_vector=with_vectors)
+            for v in vectors
+        ]
+    )
 
-        hits = client.search(
-            collection_name=QDRANT_COLLECTION,
-            query_vector=vector.tolist(),
-            limit=limit
-        )
+    # Deduplicate by point id, keeping the best score
+    best = {}
+    for hits in results:
+        for h in hits:
+            key = str(h.id)
+            if key not in best or h.score > best[key].score:
+                best[key] = h
+
+    return sorted(best.values(), key=lambda h: h.score, reverse=True)
+
+
+def _reciprocal_rank_fusion(rankings):
+    scores = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
 
-        all_hits.extend(hits)
 
-    # Deduplicate by point id
-    unique = {h.id: h for h in all_hits}
+def retrieve_chunks(queries: list[str], limit=8, with_vectors=False):
+    """
+    Hybrid retrieval: the expanded queries are searched in Qdrant and the
+    first one (the question) in the BM25 index, and the two rankings are
+    merged with reciprocal rank fusion. Hits carry the fused score, and
+    their stored embeddings with with_vectors=True.
+    """
+    if not queries:
+        return []
 
-    return list(unique.values())
+    client = get_qdrant_client()
+    vector_hits = _vector_ranking(client, queries, max(RAG_FUSION_DEPTH, limit), with_vectors)
+
+    index = get_lexical_index()
+    lexical = index.search(queries[0], max(RAG_FUSION_DEPTH, limit)) if index is not None else []
+
+    fused = _reciprocal_rank_fusion([
+        [str(h.id) for h in vector_hits],
+        [pid for pid, _ in lexical]
+    ])[:limit]
+
+    points = {str(h.id): h for h in vector_hits}
+    missing = [pid for pid, _ in fused if pid not in points]
+    if missing:
+        for record in client.retrieve(
+            collection_name=QDRANT_COLLECTION,
+            ids=missing,
+            with_payload=True,
+            with_vectors=with_vectors
+        ):
+            points[str(record.id)] = record
+
+    # points deleted since the lexical index was built are gone from Qdrant
+    return [
+        ScoredPoint(
+            id=pid, version=0, score=score,
+            payload=points[pid].payload, vector=points[pid].vector
+        )
+        for pid, score in fused
+        if pid in points
+    ]
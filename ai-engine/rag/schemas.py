@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 class Citation(BaseModel):
     document: str
@@ -12,3 +12,5 @@ class RagAnswer(BaseModel):
     citations: List[Citation]
     graph_entities: Dict[str, Any] = {}
     spatial_relations: List[Dict[str, Any]] = []
+    cached: bool = False
+    debug: Optional[Dict[str, Any]] = None
@@ -0,0 +1,23 @@
+import os
+import threading
+
+from qdrant_client import QdrantClient
+
+QDRANT_PATH = os.getenv("QDRANT_PATH", "/data/vector")
+QDRANT_COLLECTION = "city_docs"
+
+_client = None
+_lock = threading.Lock()
+
+
+def get_qdrant_client():
+    """
+    One long-lived client per process. Local (path) mode locks the storage
+    directory, so ingest and retrieval must share it anyway.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = QdrantClient(path=QDRANT_PATH)
+    return _client
@@ -1,39 +1,37 @@
-import psycopg2
 import json
-import os
-
-def _get_postgis_conn():
-  return psycopg2.connect(
-    host=os.getenv("POSTGRES_HOST", "postgis"),
-    port=int(os.getenv("POSTGRES_PORT", 5432)),
-    dbname=os.getenv("POSTGRES_DB", "citybrain"),
-    user=os.getenv("POSTGRES_USER", "citybrain"),
-    password=os.getenv("POSTGRES_PASSWORD", "citybrain")
-  )
+from spatial.buffer_materializer import BUFFER_TABLE, ensure_hospital_buffers, tier_distances
+from spatial.postgis_client import pg_connection
+from spatial.query_cache import spatial_cache
 
+@spatial_cache(["hospitals", BUFFER_TABLE])
 def fetch_hospital_buffers(distance_meters: int):
-    conn = _get_postgis_conn()
-    cur = conn.cursor()
-
-    cur.execute(f"""
-        SELECT
-          id,
-          ST_AsGeoJSON(
-            ST_Transform(
-              ST_Buffer(
-                ST_Transform(geom, 3857),
-                %s
-              ),
-              4326
-            )
-          )
-        FROM hospitals
-        LIMIT 50;
-    """, (distance_meters,))
+    """
+    Hospital buffers for one distance. Configured tiers are read from the
+    materialized table; any other distance is buffered on the fly.
+    """
+    if distance_meters in tier_distances():
+        ensure_hospital_buffers()
+        sql = f"""
+            SELECT hospital_id, ST_AsGeoJSON(geom)
+            FROM {BUFFER_TABLE}
+            WHERE distance_m = %s
+            ORDER BY hospital_id
+            LIMIT 50;
+        """
+    else:
+        sql = """
+            SELECT
+              id,
+              ST_AsGeoJSON(ST_Buffer(geom::geography, %s)::geometry)
+            FROM hospitals
+            WHERE geom IS NOT NULL
+            ORDER BY id
+            LIMIT 50;
+        """
 
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql, (distance_meters,))
+        rows = cur.fetchall()
 
     return [
         {
@@ -0,0 +1,150 @@
+import os
+import threading
+
+from psycopg2 import errors
+from spatial.postgis_client import pg_connection
+
+BUFFER_TABLE = "hospital_buffer_geoms"
+
+
+def _parse_tiers(spec):
+    tiers = []
+    for part in spec.split(","):
+        name, _, distance = part.strip().partition(":")
+        if name and distance:
+            tiers.append((name.strip().upper(), int(distance)))
+    return sorted(tiers, key=lambda t: t[1])
+
+
+# buffer_type:distance_m, innermost first
+HOSPITAL_BUFFER_TIERS = _parse_tiers(
+    os.getenv("HOSPITAL_BUFFER_TIERS", "CRITICAL:100,WARNING:200,CAUTION:500")
+)
+
+_ready = False
+_lock = threading.Lock()
+
+
+def tier_distances():
+    return [d for _, d in HOSPITAL_BUFFER_TIERS]
+
+
+def _ensure_table(cur):
+    # column types follow the hospitals table
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {BUFFER_TABLE} AS
+        SELECT
+          h.id AS hospital_id,
+          h.name AS hospital_name,
+          ''::text AS buffer_type,
+          0 AS distance_m,
+          ''::text AS source_hash,
+          NULL::geometry(Polygon, 4326) AS geom,
+          now() AS refreshed_at
+        FROM hospitals h
+        WITH NO DATA;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS {BUFFER_TABLE}_key
+          ON {BUFFER_TABLE} (hospital_id, distance_m);
+        CREATE INDEX IF NOT EXISTS {BUFFER_TABLE}_geom
+          ON {BUFFER_TABLE} USING GIST (geom);
+    """)
+
+
+def refresh_hospital_buffers(full=False):
+    """
+    Bring the materialized buffers in line with `hospitals` and the
+    configured tiers. Buffers are computed on geography so distances are
+    true metres. Only hospitals whose geometry hash, name or tier changed
+    are re-buffered; full=True recomputes everything.
+
+    Returns the ids of hospitals whose buffers changed or were removed.
+    """
+    global _ready
+    names = [name for name, _ in HOSPITAL_BUFFER_TIERS]
+    distances = tier_distances()
+
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        _ensure_table(cur)
+
+        if full:
+            # DELETE rather than TRUNCATE so row triggers see the change
+            cur.execute(f"DELETE FROM {BUFFER_TABLE}")
+
+        cur.execute(f"""
+            WITH src AS (
+              SELECT id, name, geom, md5(ST_AsEWKB(geom)) AS source_hash
+              FROM hospitals
+              WHERE geom IS NOT NULL
+            ),
+            tiers AS (
+              SELECT * FROM unnest(%s::text[], %s::int[]) AS t(buffer_type, distance_m)
+            )
+            INSERT INTO {BUFFER_TABLE} AS b
+              (hospital_id, hospital_name, buffer_type, distance_m, source_hash, geom, refreshed_at)
+            SELECT
+              s.id,
+              s.name,
+              t.buffer_type,
+              t.distance_m,
+              s.source_hash,
+              ST_Buffer(s.geom::geography, t.distance_m)::geometry,
+              now()
+            FROM src s
+            CROSS JOIN tiers t
+            LEFT JOIN {BUFFER_TABLE} old
+              ON old.hospital_id = s.id AND old.distance_m = t.distance_m
+            WHERE old.source_hash IS DISTINCT FROM s.source_hash
+               OR old.hospital_name IS DISTINCT FROM s.name
+               OR old.buffer_type IS DISTINCT FROM t.buffer_type
+            ON CONFLICT (hospital_id, distance_m) DO UPDATE SET
+              hospital_name = EXCLUDED.hospital_name,
+              buffer_type = EXCLUDED.buffer_type,
+              source_hash = EXCLUDED.source_hash,
+              geom = EXCLUDED.geom,
+              refreshed_at = EXCLUDED.refreshed_at
+            RETURNING hospital_id
+        """, (names, distances))
+        changed = {r[0] for r in cur.fetchall()}
+
+        # hospitals that disappeared and tiers that are no longer configured
+        cur.execute(f"""
+            DELETE FROM {BUFFER_TABLE} b
+            WHERE b.distance_m <> ALL(%s)
+               OR NOT EXISTS (
+                 SELECT 1 FROM hospitals h
+                 WHERE h.id = b.hospital_id AND h.geom IS NOT NULL
+               )
+            RETURNING hospital_id
+        """, (distances,))
+        changed |= {r[0] for r in cur.fetchall()}
+
+        conn.commit()
+        cur.close()
+
+    _ready = True
+    print(f"Hospital buffers refreshed: {len(changed)} hospitals changed")
+    return sorted(changed)
+
+
+def ensure_hospital_buffers():
+    """
+    Materialize the buffers once per process if the pipeline has not.
+    """
+    global _ready
+    if _ready:
+        return
+    with _lock:
+        if _ready:
+            return
+        try:
+            with pg_connection() as conn, conn.cursor() as cur:
+                cur.execute(f"SELECT 1 FROM {BUFFER_TABLE} LIMIT 1")
+                exists = cur.fetchone() is not None
+        except errors.UndefinedTable:
+            exists = False
+        if exists:
+            _ready = True
+        else:
+            refresh_hospital_buffers()
@@ -0,0 +1,78 @@
+import hashlib
+import os
+import threading
+import time
+
+from cache import get_redis
+from spatial.postgis_client import pg_connection
+
+DATA_VERSION_TTL_S = float(os.getenv("DATA_VERSION_TTL_S", 5))
+
+DATA_GENERATION_KEY = "citybrain:data_generation"
+
+_generation = 0
+_cached = {}
+_lock = threading.Lock()
+
+
+def _current_generation():
+    client = get_redis()
+    if client is not None:
+        try:
+            return int(client.get(DATA_GENERATION_KEY) or 0)
+        except Exception:
+            pass
+    return _generation
+
+
+def bump_data_version():
+    """
+    Explicit invalidation for the build pipeline. Shared through Redis
+    when available; other workers notice within DATA_VERSION_TTL_S.
+    """
+    global _generation
+    with _lock:
+        _generation += 1
+        _cached.clear()
+
+    client = get_redis()
+    if client is not None:
+        try:
+            client.incr(DATA_GENERATION_KEY)
+        except Exception:
+            pass
+
+
+def data_version(tables, with_generation=True) -> str:
+    """
+    Short token that changes whenever any of `tables` is written to or
+    recreated, taken from pg_stat_user_tables (table oid plus cumulative
+    insert/update/delete counters), and, unless with_generation=False,
+    on bump_data_version. Cached for DATA_VERSION_TTL_S so callers can
+    check it on every request.
+    """
+    key = (tuple(sorted(tables)), with_generation)
+    now = time.monotonic()
+
+    with _lock:
+        hit = _cached.get(key)
+        if hit and hit[1] > now:
+            return hit[0]
+
+    generation = _current_generation() if with_generation else ""
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT relname, relid, n_tup_ins + n_tup_upd + n_tup_del
+            FROM pg_stat_user_tables
+            WHERE relname = ANY(%s)
+            ORDER BY relname
+        """, (list(key[0]),))
+        rows = cur.fetchall()
+
+    raw = f"{generation}|" + "|".join(f"{r[0]}:{r[1]}:{r[2]}" for r in rows)
+    token = hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    with _lock:
+        _cached[key] = (token, now + DATA_VERSION_TTL_S)
+    return token
@@ -1,3 +1,10 @@
+import os
+import uuid
+
+from spatial.postgis_client import pg_connection
+
+GEOJSON_STREAM_BATCH = int(os.getenv("GEOJSON_STREAM_BATCH", 1000))
+
 def to_feature_collection(geoms, properties=None):
     features = []
 
@@ -12,3 +19,50 @@ def to_feature_collection(geoms, properties=None):
         "type": "FeatureCollection",
         "features": features
     }
+
+def stream_features(sql, params=None, fmt="geojson", batch_size=GEOJSON_STREAM_BATCH):
+    """
+    Yield a layer as text chunks, one chunk per batch of rows. `sql` must
+    return a single column holding each Feature already serialized by
+    PostGIS (json_build_object(...)::text), so rows go out without being
+    parsed. fmt="geojson" wraps them in a FeatureCollection, "ndjson"
+    writes one Feature per line.
+
+    The query runs through a server-side cursor on a pooled connection
+    held until the generator is exhausted or closed. The first chunk is
+    only yielded after the first batch arrives, so callers can pull it
+    eagerly to surface query errors before the response starts.
+    """
+    with pg_connection() as conn:
+        cur = conn.cursor(name=f"geojson_{uuid.uuid4().hex}")
+        cur.itersize = batch_size
+        try:
+            cur.execute(sql, params)
+            rows = cur.fetchmany(batch_size)
+
+            if fmt == "ndjson":
+                while rows:
+                    yield "".join(r[0] + "\n" for r in rows)
+                    rows = cur.fetchmany(batch_size)
+                return
+
+            prefix = '{"type":"FeatureCollection","features":['
+            while rows:
+                yield prefix + ",".join(r[0] for r in rows)
+                prefix = ","
+                rows = cur.fetchmany(batch_size)
+            yield ("" if prefix == "," else prefix) + "]}"
+        finally:
+            cur.close()
+
+def feature_sql(geometry, properties):
+    """
+    SQL expression serializing one row as a GeoJSON Feature. `properties`
+    maps property names to SQL expressions.
+    """
+    props = ", ".join(f"'{name}', {expr}" for name, expr in properties.items())
+    return (
+        "json_build_object('type', 'Feature', "
+        f"'geometry', {geometry}::json, "
+        f"'properties', json_build_object({props}))::text"
+    )
@@ -1,40 +1,76 @@
-import psycopg2
 import json
-import os
-
-def _get_postgis_conn():
-    return psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST", "postgis"),
-        port=int(os.getenv("POSTGRES_PORT", 5432)),
-        dbname=os.getenv("POSTGRES_DB", "citybrain"),
-        user=os.getenv("POSTGRES_USER", "citybrain"),
-        password=os.getenv("POSTGRES_PASSWORD", "citybrain")
+import math
+from spatial.geojson import feature_sql
+from spatial.postgis_client import pg_connection
+from spatial.query_cache import spatial_cache
+
+def geojson_sql(column: str, zoom=None):
+    """
+    ST_AsGeoJSON expression for `column`. With a map zoom level the
+    geometry is simplified to about one pixel and coordinates are rounded
+    to the precision that zoom can show.
+    """
+    if zoom is None:
+        return f"ST_AsGeoJSON({column})", ()
+
+    pixels_per_degree = 256 * 2 ** zoom / 360.0
+    tolerance = 1.0 / pixels_per_degree
+    digits = max(0, min(9, math.ceil(math.log10(pixels_per_degree)) + 1))
+
+    return (
+        f"ST_AsGeoJSON(ST_SimplifyPreserveTopology({column}, %s), %s)",
+        (tolerance, digits)
     )
 
-def fetch_geometries(entity_type: str):
-    conn = _get_postgis_conn()
-    cur = conn.cursor()
-
-    if entity_type == "hospital":
-        cur.execute("""
-            SELECT id, ST_AsGeoJSON(geom)
-            FROM hospitals
-            WHERE geom IS NOT NULL
-            LIMIT 500;
-        """)
-    elif entity_type == "road":
-        cur.execute("""
-            SELECT id, ST_AsGeoJSON(geom)
-            FROM roads
-            WHERE geom IS NOT NULL
-            LIMIT 500;
-        """)
-    else:
+def fetch_geometries_by_ids(table: str, key_column: str, keys, geom_column="way", zoom=None, where=None):
+    """
+    Fetch GeoJSON geometries for many keys with one `= ANY(%s)` query.
+    Returns {key: geometry}; keys without a row are left out.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+
+    geom_sql, geom_params = geojson_sql(geom_column, zoom)
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT DISTINCT ON ({key_column}) {key_column}, {geom_sql}
+            FROM {table}
+            WHERE {key_column} = ANY(%s)
+              {"AND " + where if where else ""}
+            ORDER BY {key_column}
+        """, (*geom_params, keys))
+        rows = cur.fetchall()
+
+    return {
+        key: json.loads(geom)
+        for key, geom in rows
+        if geom is not None
+    }
+
+HIGHLIGHT_TABLES = {
+    "hospital": "hospitals",
+    "road": "roads",
+}
+
+def _highlight_table(entity_type: str):
+    if entity_type not in HIGHLIGHT_TABLES:
         raise ValueError("Unsupported entity")
+    return HIGHLIGHT_TABLES[entity_type]
 
-    rows = cur.fetchall()
-    cur.close()
-    conn.close()
+@spatial_cache(["hospitals", "roads"])
+def fetch_geometries(entity_type: str):
+    sql = f"""
+        SELECT id, ST_AsGeoJSON(geom)
+        FROM {_highlight_table(entity_type)}
+        WHERE geom IS NOT NULL
+        LIMIT 500;
+    """
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(sql)
+        rows = cur.fetchall()
 
     return [
         {
@@ -47,3 +83,18 @@ def fetch_geometries(entity_type: str):
         }
         for r in rows
     ]
+
+def highlight_features_sql(entity_type: str):
+    """
+    (sql, params) for the whole highlight layer as serialized Features,
+    for stream_features. Unlike fetch_geometries it is not capped.
+    """
+    feature = feature_sql("ST_AsGeoJSON(geom)", {
+        "id": "id",
+        "highlight": "%s",
+    })
+    return f"""
+        SELECT {feature}
+        FROM {_highlight_table(entity_type)}
+        WHERE geom IS NOT NULL
+    """, (entity_type,)
@@ -0,0 +1,139 @@
+import os
+import threading
+
+from psycopg2 import errors
+from spatial.postgis_client import pg_connection
+from spatial.road_locator import nearest_roads
+
+HOSPITAL_ROAD_TOP_K = int(os.getenv("HOSPITAL_ROAD_TOP_K", 5))
+
+_hospitals = None
+_lock = threading.Lock()
+
+
+def build_hospital_road_table(k=HOSPITAL_ROAD_TOP_K):
+    """
+    Materialize every hospital's k nearest roads. The mapping only changes
+    when OSM is re-imported, so the impact endpoints read it instead of
+    running a LATERAL KNN per hospital per request.
+    """
+    print(f"Building hospital → nearest {k} roads table")
+
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        cur.execute("""
+            DROP TABLE IF EXISTS hospital_nearest_roads_new;
+            CREATE TABLE hospital_nearest_roads_new AS
+            SELECT
+              h.osm_id AS hospital_id,
+              h.name,
+              ST_Y(h.way) AS lat,
+              ST_X(h.way) AS lon,
+              row_number() OVER (PARTITION BY h.osm_id ORDER BY r.knn) AS rank,
+              r.osm_id AS road_id,
+              ST_Distance(h.way::geography, r.way::geography) AS distance_m
+            FROM planet_osm_point h
+            CROSS JOIN LATERAL (
+              SELECT osm_id, way, h.way <-> planet_osm_roads.way AS knn
+              FROM planet_osm_roads
+              ORDER BY h.way <-> planet_osm_roads.way
+              LIMIT %s
+            ) r
+            WHERE h.amenity = 'hospital';
+
+            CREATE INDEX ON hospital_nearest_roads_new (road_id);
+            CREATE INDEX ON hospital_nearest_roads_new (hospital_id, rank);
+
+            DROP TABLE IF EXISTS hospital_nearest_roads;
+            ALTER TABLE hospital_nearest_roads_new RENAME TO hospital_nearest_roads;
+        """, (k,))
+        cur.execute("SELECT COUNT(DISTINCT hospital_id) FROM hospital_nearest_roads")
+        count = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+
+    invalidate_hospital_roads()
+    print(f"Snapped {count} hospitals to their nearest roads")
+    return {"hospitals": count, "k": k}
+
+
+def _load():
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT hospital_id, name, lat, lon, array_agg(road_id ORDER BY rank)
+            FROM hospital_nearest_roads
+            GROUP BY hospital_id, name, lat, lon
+        """)
+        return [
+            {
+                "hospital_id": hid,
+                "name": name,
+                "lat": lat,
+                "lon": lon,
+                "roads": roads
+            }
+            for hid, name, lat, lon, roads in cur.fetchall()
+        ]
+
+
+def get_hospital_roads():
+    """
+    Cached list of hospitals with their nearest roads, closest first.
+    The table is built on first use if the pipeline has not made it yet.
+    """
+    global _hospitals
+    if _hospitals is None:
+        with _lock:
+            if _hospitals is None:
+                try:
+                    hospitals = _load()
+                except errors.UndefinedTable:
+                    build_hospital_road_table()
+                    hospitals = _load()
+                _hospitals = hospitals
+    return _hospitals
+
+
+def prime_hospital_roads(hospitals):
+    """
+    Use an already loaded mapping, e.g. from the graph snapshot.
+    """
+    global _hospitals
+    _hospitals = hospitals
+
+
+def invalidate_hospital_roads():
+    global _hospitals
+    _hospitals = None
+
+
+def nearest_unaffected_roads(hospitals, affected_road_ids):
+    """
+    Map hospital_id -> nearest road not in affected_road_ids. The
+    precomputed top-k list answers most hospitals; the rest are snapped
+    together by the in-memory road locator.
+    """
+    affected = set(affected_road_ids)
+    result = {}
+    pending = []
+
+    for h in hospitals:
+        alt = next((r for r in h["roads"] if r not in affected), None)
+        if alt is not None:
+            result[h["hospital_id"]] = alt
+        else:
+            pending.append(h)
+
+    if not pending:
+        return result
+
+    nearest = nearest_roads(
+        [(h["lon"], h["lat"]) for h in pending],
+        k=1,
+        exclude_ids=affected
+    )
+    for h, roads in zip(pending, nearest):
+        if roads:
+            result[h["hospital_id"]] = roads[0][0]
+
+    return result
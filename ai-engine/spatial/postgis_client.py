@@ -1,21 +1,196 @@
-import psycopg2
 import os
+import threading
+import time
+from contextlib import contextmanager
 
-class PostGISClient:
-    def __init__(self):
-        self.conn = psycopg2.connect(
-            host=os.getenv("POSTGRES_HOST", "postgis"),
-            port=os.getenv("POSTGRES_PORT", 5432),
-            dbname=os.getenv("POSTGRES_DB", "citybrain"),
-            user=os.getenv("POSTGRES_USER", "postgres"),
-            password=os.getenv("POSTGRES_PASSWORD", "postgres")
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.pool import ThreadedConnectionPool
+
+PG_POOL_MIN = int(os.getenv("PG_POOL_MIN", 2))
+PG_POOL_MAX = int(os.getenv("PG_POOL_MAX", 10))
+PG_POOL_TIMEOUT_S = float(os.getenv("PG_POOL_TIMEOUT_S", 30))
+PG_POOL_HEALTHCHECK_IDLE_S = float(os.getenv("PG_POOL_HEALTHCHECK_IDLE_S", 30))
+PG_STATEMENT_TIMEOUT_MS = int(os.getenv("PG_STATEMENT_TIMEOUT_MS", 30000))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def connection_settings():
+    return {
+        "host": os.getenv("POSTGRES_HOST", "postgis"),
+        "port": int(os.getenv("POSTGRES_PORT", 5432)),
+        "dbname": os.getenv("POSTGRES_DB", "citybrain"),
+        "user": os.getenv("POSTGRES_USER", "citybrain"),
+        "password": os.getenv("POSTGRES_PASSWORD", "citybrain"),
+    }
+
+
+class PostGISPool:
+    """
+    Thread-safe PostGIS connection pool.
+
+    ThreadedConnectionPool raises as soon as it is exhausted, so checkouts
+    are gated by a semaphore and block (up to timeout) for a free slot
+    instead. Connections idle for longer than the health-check window are
+    pinged before being handed out.
+    """
+
+    def __init__(self, minconn=PG_POOL_MIN, maxconn=PG_POOL_MAX, timeout=PG_POOL_TIMEOUT_S):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = ThreadedConnectionPool(
+            minconn,
+            maxconn,
+            options=f"-c statement_timeout={PG_STATEMENT_TIMEOUT_MS}",
+            **connection_settings()
         )
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._lock = threading.Lock()
+        self._last_used = {}
+
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.checkouts = 0
+        self.timeouts = 0
+        self.discarded = 0
+        self.wait_total_s = 0.0
+        self.wait_max_s = 0.0
+
+    def _healthy(self, conn):
+        if conn.closed:
+            return False
+
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < PG_POOL_HEALTHCHECK_IDLE_S:
+            return True
+
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No PostGIS connection free after {self.timeout}s")
+        waited = time.perf_counter() - started
 
+        try:
+            conn = self._pool.getconn()
+            while not self._healthy(conn):
+                self._pool.putconn(conn, close=True)
+                with self._lock:
+                    self.discarded += 1
+                conn = self._pool.getconn()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            self.checkouts += 1
+            self.wait_total_s += waited
+            self.wait_max_s = max(self.wait_max_s, waited)
+
+        return conn
+
+    def putconn(self, conn):
+        close = bool(conn.closed)
+        if not close:
+            try:
+                if conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except psycopg2.Error:
+                close = True
+
+        if close:
+            self._last_used.pop(id(conn), None)
+        else:
+            self._last_used[id(conn)] = time.monotonic()
+        self._pool.putconn(conn, close=close)
+        with self._lock:
+            self.in_use -= 1
+            if close:
+                self.discarded += 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "min_size": self.minconn,
+                "max_size": self.maxconn,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "utilisation": round(self.in_use / self.maxconn, 3),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "discarded": self.discarded,
+                "wait_ms_avg": round(1000 * self.wait_total_s / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(1000 * self.wait_max_s, 3),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PostGISPool()
+    return _pool
+
+
+def pool_stats():
+    return get_pool().stats() if _pool is not None else {}
+
+
+@contextmanager
+def pg_connection(statement_timeout_ms=None):
+    """
+    Borrow a pooled connection. Uncommitted work is rolled back when the
+    connection goes back, so writers must commit explicitly. Pass
+    statement_timeout_ms=0 for long build queries.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        if statement_timeout_ms is not None:
+            with conn.cursor() as cur:
+                cur.execute("SET statement_timeout = %s", (int(statement_timeout_ms),))
+            conn.commit()
+        yield conn
+    finally:
+        if statement_timeout_ms is not None and not conn.closed:
+            try:
+                conn.rollback()
+                with conn.cursor() as cur:
+                    cur.execute("RESET statement_timeout")
+                conn.commit()
+            except psycopg2.Error:
+                pass
+        pool.putconn(conn)
+
+
+class PostGISClient:
     def query(self, sql: str, params=None):
-        with self.conn.cursor() as cur:
+        with pg_connection() as conn, conn.cursor() as cur:
             cur.execute(sql, params or [])
             cols = [desc[0] for desc in cur.description]
             return [dict(zip(cols, row)) for row in cur.fetchall()]
 
     def close(self):
-        self.conn.close()
+        # connections are returned to the pool after every query
+        pass
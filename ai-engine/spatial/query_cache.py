@@ -0,0 +1,50 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+
+from cache import TieredCache
+from spatial.data_version import bump_data_version, data_version
+
+SPATIAL_CACHE_SIZE = int(os.getenv("SPATIAL_CACHE_SIZE", 256))
+SPATIAL_CACHE_TTL_S = float(os.getenv("SPATIAL_CACHE_TTL_S", 3600))
+
+_cache = TieredCache("spatial", SPATIAL_CACHE_SIZE, SPATIAL_CACHE_TTL_S)
+
+
+def spatial_cache(tables):
+    """
+    Cache a spatial query function's (JSON-serializable) result, keyed by
+    the function, its bound arguments and the data version of `tables`.
+    Writes to those tables or invalidate_spatial_cache() retire old
+    entries. Results are shared, so treat them as read-only.
+    """
+    def decorator(fn):
+        name = f"{fn.__module__}.{fn.__qualname__}"
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = json.dumps(bound.arguments, sort_keys=True, default=str)
+            digest = hashlib.sha1(arguments.encode("utf-8")).hexdigest()[:16]
+
+            key = (name, data_version(tables), digest)
+            result = _cache.get(key)
+            if result is None:
+                result = fn(*args, **kwargs)
+                _cache.set(key, result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def invalidate_spatial_cache():
+    """
+    Called by the build pipeline after it rewrites spatial tables.
+    """
+    bump_data_version()
+    _cache.clear()
@@ -0,0 +1,180 @@
+import math
+import os
+import threading
+
+import numpy as np
+import shapely
+
+from spatial.data_version import data_version
+from spatial.postgis_client import pg_connection
+
+# first search radius; grown 4x per round for points that still lack k roads
+NEAREST_ROAD_RADIUS_M = float(os.getenv("NEAREST_ROAD_RADIUS_M", 250))
+NEAREST_ROAD_MAX_RADIUS_M = float(os.getenv("NEAREST_ROAD_MAX_RADIUS_M", 50000))
+
+METRES_PER_DEGREE = 111320.0
+
+
+class RoadLocator:
+    """
+    In-memory STRtree over planet_osm_roads for nearest-road snapping.
+
+    Geometries are kept in a local equirectangular projection (lon scaled
+    by cos of the mean latitude, both axes in metres), which is within a
+    fraction of a percent of true distance across one city.
+    """
+
+    def __init__(self, osm_ids, geoms, lat0):
+        self.osm_ids = np.asarray(osm_ids, dtype=np.int64)
+        self.lat0 = lat0
+        self._kx = METRES_PER_DEGREE * math.cos(math.radians(lat0))
+        self.geoms = shapely.transform(geoms, self._project)
+        self.tree = shapely.STRtree(self.geoms)
+
+    @classmethod
+    def from_wkb(cls, osm_ids, wkbs):
+        geoms = shapely.from_wkb(np.asarray(wkbs, dtype=object))
+        bounds = shapely.total_bounds(geoms)
+        lat0 = (bounds[1] + bounds[3]) / 2 if len(geoms) else 0.0
+        return cls(osm_ids, geoms, lat0)
+
+    def _project(self, coords):
+        return np.column_stack([coords[:, 0] * self._kx, coords[:, 1] * METRES_PER_DEGREE])
+
+    @property
+    def road_count(self):
+        return len(self.osm_ids)
+
+    def nearest_roads(self, points, k=1, exclude_ids=None):
+        """
+        For each (lon, lat) point return its k nearest distinct roads as
+        [(osm_id, distance_m), ...], closest first, skipping exclude_ids.
+        All points are answered together with vectorized tree queries.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        results = [[] for _ in range(len(points))]
+        if len(points) == 0 or self.road_count == 0:
+            return results
+
+        pts = shapely.points(self._project(points))
+        excluded = (
+            np.isin(self.osm_ids, np.fromiter(exclude_ids, dtype=np.int64))
+            if exclude_ids is not None and len(exclude_ids) else None
+        )
+
+        pending = np.arange(len(points))
+        radius = NEAREST_ROAD_RADIUS_M
+        while len(pending):
+            x, y = shapely.get_x(pts[pending]), shapely.get_y(pts[pending])
+            boxes = shapely.box(x - radius, y - radius, x + radius, y + radius)
+            which, road = self.tree.query(boxes)
+
+            if excluded is not None:
+                keep = ~excluded[road]
+                which, road = which[keep], road[keep]
+
+            dist = shapely.distance(pts[pending[which]], self.geoms[road])
+            # anything inside the radius is complete; beyond it may be beaten
+            # by a road outside the box
+            inside = dist <= radius
+            which, road, dist = which[inside], road[inside], dist[inside]
+            ids = self.osm_ids[road]
+
+            # split ways share an osm_id: keep the closest part per point
+            order = np.lexsort((dist, ids, which))
+            which, ids, dist = which[order], ids[order], dist[order]
+            first = np.ones(len(which), dtype=bool)
+            first[1:] = (which[1:] != which[:-1]) | (ids[1:] != ids[:-1])
+            which, ids, dist = which[first], ids[first], dist[first]
+
+            order = np.lexsort((dist, which))
+            which, ids, dist = which[order], ids[order], dist[order]
+            counts = np.bincount(which, minlength=len(pending))
+
+            final = radius >= NEAREST_ROAD_MAX_RADIUS_M
+            done = (counts >= k) | final
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            for i in np.nonzero(done)[0]:
+                s = starts[i]
+                n = min(k, counts[i])
+                results[pending[i]] = [
+                    (int(ids[s + j]), round(float(dist[s + j]), 1)) for j in range(n)
+                ]
+
+            pending = pending[~done]
+            radius *= 4
+
+        return results
+
+
+_locator = None
+_version = None
+_reloading = False
+_lock = threading.Lock()
+
+
+def load_from_postgis():
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute("""
+            SELECT osm_id, ST_AsBinary(way)
+            FROM planet_osm_roads
+            WHERE osm_id IS NOT NULL AND way IS NOT NULL
+        """)
+        rows = cur.fetchall()
+
+    return RoadLocator.from_wkb(
+        [r[0] for r in rows],
+        [bytes(r[1]) for r in rows]
+    )
+
+
+def _load(version):
+    global _locator, _version
+    locator = load_from_postgis()
+    _locator, _version = locator, version
+    print(f"Road locator loaded: {locator.road_count} road geometries")
+    return locator
+
+
+def _roads_version():
+    # only road writes matter here, not builds of other spatial tables
+    return data_version(["planet_osm_roads"], with_generation=False)
+
+
+def refresh_road_locator():
+    with _lock:
+        return _load(_roads_version())
+
+
+def _reload(version):
+    global _reloading
+    try:
+        with _lock:
+            if version != _version:
+                _load(version)
+    except Exception as e:
+        print(f"Road locator reload failed: {e}")
+    finally:
+        _reloading = False
+
+
+def get_road_locator():
+    """
+    The shared locator. Only the first load blocks; when planet_osm_roads
+    changes the new tree is built in the background while the old one
+    keeps answering.
+    """
+    global _reloading
+    version = _roads_version()
+    if _locator is None:
+        with _lock:
+            if _locator is None:
+                return _load(version)
+    if version != _version and not _reloading:
+        _reloading = True
+        threading.Thread(target=_reload, args=(version,), daemon=True).start()
+    return _locator
+
+
+def nearest_roads(points, k=1, exclude_ids=None):
+    return get_road_locator().nearest_roads(points, k=k, exclude_ids=exclude_ids)
@@ -0,0 +1,54 @@
+import os
+
+from spatial.postgis_client import pg_connection
+
+# UTM zone 43N: metric and close to true scale over Ahmedabad
+PROJECTED_SRID = int(os.getenv("PROJECTED_SRID", 32643))
+
+PROJECTED_TABLES = {
+    "planet_osm_roads": "way",
+    "planet_osm_point": "way",
+    "planet_osm_polygon": "way",
+}
+
+
+def projected(column):
+    """
+    `column` in the projected CRS. Queries must use exactly this
+    expression for the planner to pick the functional GiST indexes.
+    """
+    return f"ST_Transform({column}, {PROJECTED_SRID})"
+
+
+def projected_index_name(table):
+    return f"{table}_way_{PROJECTED_SRID}"
+
+
+def ensure_projected_indexes():
+    """
+    Functional GiST indexes on the projected geometry of the OSM tables,
+    so metric ST_DWithin/KNN queries stay index scans. Cheap when they
+    already exist; the first run builds them once after an OSM import.
+    """
+    created = []
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        for table, column in PROJECTED_TABLES.items():
+            index = projected_index_name(table)
+            cur.execute("SELECT to_regclass(%s) IS NULL", (index,))
+            if not cur.fetchone()[0]:
+                continue
+
+            print(f"Creating {index}")
+            cur.execute(f"""
+                CREATE INDEX IF NOT EXISTS {index}
+                ON {table} USING GIST ({projected(column)})
+            """)
+            # expression indexes only get statistics from ANALYZE
+            cur.execute(f"ANALYZE {table}")
+            created.append(index)
+
+        conn.commit()
+        cur.close()
+
+    return created
@@ -1,31 +1,45 @@
+import os
+
 from spatial.postgis_client import PostGISClient
+from spatial.query_cache import spatial_cache
+from spatial.schema import projected
 
-def analyze_road_hospital_proximity(max_distance_m=200):
-    db = PostGISClient()
-    sql = """
+PROXIMITY_SQL = f"""
     SELECT
         h.osm_id      AS hospital_id,
         h.name        AS hospital_name,
         r.osm_id      AS road_id,
         r.name        AS road_name,
         ST_Distance(
-            ST_Transform(h.way, 3857),
-            ST_Transform(r.way, 3857)
+            {projected("h.way")},
+            {projected("r.way")}
         ) AS distance_m
     FROM planet_osm_point h
     JOIN planet_osm_roads r
       ON ST_DWithin(
-           ST_Transform(h.way, 3857),
-           ST_Transform(r.way, 3857),
+           {projected("h.way")},
+           {projected("r.way")},
            %s
          )
     WHERE h.amenity = 'hospital'
       AND r.highway IS NOT NULL
     ORDER BY distance_m ASC
     LIMIT 50;
-    """
-    return db.query(sql, [max_distance_m])
+"""
+
+# roads closer than this to a junction point meet at it
+JUNCTION_SNAP_M = float(os.getenv("JUNCTION_SNAP_M", 5.5))
 
-    db.close()
+ROAD_JUNCTION_SQL = f"""
+    SELECT
+      j.id,
+      r.osm_id
+    FROM road_junctions j
+    JOIN planet_osm_roads r
+      ON ST_DWithin({projected("j.geom")}, {projected("r.way")}, %s)
+"""
 
-    return results
+@spatial_cache(["planet_osm_point", "planet_osm_roads"])
+def analyze_road_hospital_proximity(max_distance_m=200):
+    db = PostGISClient()
+    return db.query(PROXIMITY_SQL, [max_distance_m])
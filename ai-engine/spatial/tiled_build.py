@@ -0,0 +1,164 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from spatial.postgis_client import PG_POOL_MAX, pg_connection
+
+TILED_BUILD_GRID = int(os.getenv("TILED_BUILD_GRID", 8))
+# leave a pooled connection for the API while a build runs
+TILED_BUILD_WORKERS = int(os.getenv("TILED_BUILD_WORKERS", max(1, min(os.cpu_count() or 1, PG_POOL_MAX - 1))))
+
+PROGRESS_TABLE = "tiled_build_progress"
+
+
+def owned_by_tile(column):
+    """
+    Predicate assigning each geometry to exactly one tile: the one that
+    holds the lower-left corner of its bbox. The && keeps it an index scan.
+    """
+    return f"""
+        {column} && ST_MakeEnvelope(%(x0)s, %(y0)s, %(x1)s, %(y1)s, 4326)
+        AND ST_XMin({column}) >= %(x0)s AND ST_XMin({column}) < %(x1)s
+        AND ST_YMin({column}) >= %(y0)s AND ST_YMin({column}) < %(y1)s
+    """
+
+
+def _plan_tiles(cur, job, source_table, grid):
+    cur.execute(f"""
+        SELECT ST_XMin(e), ST_YMin(e), ST_XMax(e), ST_YMax(e)
+        FROM (SELECT ST_Extent(way) AS e FROM {source_table}) s
+    """)
+    xmin, ymin, xmax, ymax = cur.fetchone()
+    if xmin is None:
+        return 0
+
+    # nudge the far edge so geometries on it fall inside the last tile
+    dx = (xmax - xmin) / grid + 1e-9
+    dy = (ymax - ymin) / grid + 1e-9
+
+    cur.execute(f"DELETE FROM {PROGRESS_TABLE} WHERE job = %s", (job,))
+    for i in range(grid):
+        for j in range(grid):
+            cur.execute(f"""
+                INSERT INTO {PROGRESS_TABLE} (job, tile, x0, y0, x1, y1)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (
+                job, i * grid + j,
+                xmin + i * dx, ymin + j * dy,
+                xmin + (i + 1) * dx, ymin + (j + 1) * dy
+            ))
+    return grid * grid
+
+
+def _run_tile(job, table, columns, tile_sql, tile):
+    tile_id, x0, y0, x1, y1 = tile
+    started = time.perf_counter()
+
+    # results and the 'done' mark commit together, so a tile is either
+    # fully written or retried on resume
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute(f"""
+                INSERT INTO {table} ({", ".join(columns)})
+                {tile_sql}
+                ON CONFLICT DO NOTHING
+            """, {"x0": x0, "y0": y0, "x1": x1, "y1": y1})
+            rows = cur.rowcount
+            elapsed = time.perf_counter() - started
+            cur.execute(f"""
+                UPDATE {PROGRESS_TABLE}
+                SET status = 'done', row_count = %s, seconds = %s, error = NULL, updated_at = now()
+                WHERE job = %s AND tile = %s
+            """, (rows, elapsed, job, tile_id))
+            conn.commit()
+            return rows, elapsed
+        except Exception as e:
+            conn.rollback()
+            cur.execute(f"""
+                UPDATE {PROGRESS_TABLE}
+                SET status = 'failed', error = %s, updated_at = now()
+                WHERE job = %s AND tile = %s
+            """, (str(e)[:1000], job, tile_id))
+            conn.commit()
+            raise
+        finally:
+            cur.close()
+
+
+def run_tiled_build(job, table, columns, source_table, tile_sql,
+                    grid=TILED_BUILD_GRID, workers=TILED_BUILD_WORKERS, resume=False):
+    """
+    Fill `table` (whose primary key dedupes pairs found from both sides of
+    a tile border) by running tile_sql once per grid tile over the extent
+    of source_table, on `workers` pooled connections at a time. tile_sql
+    selects `columns` and restricts its driving geometry with
+    owned_by_tile(). Per-tile status lives in tiled_build_progress;
+    resume=True only reruns tiles that are not done.
+    """
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {PROGRESS_TABLE} (
+                job TEXT,
+                tile INT,
+                x0 FLOAT8, y0 FLOAT8, x1 FLOAT8, y1 FLOAT8,
+                status TEXT DEFAULT 'pending',
+                row_count BIGINT,
+                seconds FLOAT8,
+                error TEXT,
+                updated_at TIMESTAMPTZ DEFAULT now(),
+                PRIMARY KEY (job, tile)
+            )
+        """)
+
+        cur.execute(f"SELECT COUNT(*) FROM {PROGRESS_TABLE} WHERE job = %s", (job,))
+        if not resume or cur.fetchone()[0] == 0:
+            cur.execute(f"TRUNCATE {table}")
+            _plan_tiles(cur, job, source_table, grid)
+
+        cur.execute(f"""
+            SELECT tile, x0, y0, x1, y1
+            FROM {PROGRESS_TABLE}
+            WHERE job = %s AND status <> 'done'
+            ORDER BY tile
+        """, (job,))
+        pending = cur.fetchall()
+        cur.execute(f"SELECT COUNT(*) FROM {PROGRESS_TABLE} WHERE job = %s", (job,))
+        total = cur.fetchone()[0]
+
+        conn.commit()
+        cur.close()
+
+    print(f"{job}: {len(pending)} of {total} tiles to build with {workers} workers")
+    started = time.perf_counter()
+    done = total - len(pending)
+    failed = []
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_run_tile, job, table, columns, tile_sql, tile): tile[0]
+            for tile in pending
+        }
+        for future in as_completed(futures):
+            tile_id = futures[future]
+            try:
+                rows, elapsed = future.result()
+            except Exception as e:
+                failed.append(tile_id)
+                print(f"{job}: tile {tile_id} failed: {e}")
+                continue
+            done += 1
+            print(f"{job}: tile {tile_id} done ({done}/{total}), {rows} rows in {elapsed:.1f}s")
+
+    if failed:
+        raise RuntimeError(
+            f"{job}: {len(failed)} tiles failed ({sorted(failed)}); rerun with resume=True"
+        )
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"SELECT COUNT(*) FROM {table}")
+        count = cur.fetchone()[0]
+
+    print(f"{job}: {count} rows in {time.perf_counter() - started:.1f}s")
+    return count
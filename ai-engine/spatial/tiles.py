@@ -0,0 +1,155 @@
+import os
+
+from cache import TieredCache
+from spatial.buffer_materializer import BUFFER_TABLE, ensure_hospital_buffers
+from spatial.data_version import data_version
+from spatial.postgis_client import pg_connection
+from spatial.violation_detector import VIOLATION_TABLE, ensure_violations_fresh
+
+TILE_CACHE_SIZE = int(os.getenv("TILE_CACHE_SIZE", 2048))
+TILE_CACHE_TTL_S = float(os.getenv("TILE_CACHE_TTL_S", 3600))
+
+TILE_EXTENT = 4096
+# deepest zoom any map client asks for
+TILE_MAX_ZOOM = 24
+TILE_BUFFER = 64
+# part of the cache key; bump when the tile contents change shape
+TILE_FORMAT = 2
+
+# Each layer selects `geom` (SRID 4326) plus its properties; tiles clip
+# it to the requested envelope and carry only the listed properties.
+# Tables are the ones that version the layer; `prepare` brings derived
+# tables up to date before the version is read.
+LAYERS = {
+    "roads": {
+        "min_zoom": 10,
+        "tables": ["planet_osm_roads"],
+        "properties": ["osm_id", "name", "highway"],
+        "sql": """
+            SELECT osm_id, name, highway, way AS geom
+            FROM planet_osm_roads
+            WHERE highway IS NOT NULL
+        """,
+    },
+    "hospitals": {
+        "min_zoom": 8,
+        "tables": ["planet_osm_point"],
+        "properties": ["osm_id", "name"],
+        "sql": """
+            SELECT osm_id, name, way AS geom
+            FROM planet_osm_point
+            WHERE amenity = 'hospital'
+        """,
+    },
+    "hospital_buffers": {
+        "min_zoom": 10,
+        "tables": [BUFFER_TABLE],
+        "prepare": ensure_hospital_buffers,
+        "properties": ["hospital", "buffer_type", "distance_m"],
+        "sql": f"""
+            SELECT hospital_name AS hospital, buffer_type, distance_m, geom
+            FROM {BUFFER_TABLE}
+        """,
+    },
+    "violations": {
+        "min_zoom": 8,
+        "tables": [VIOLATION_TABLE],
+        "prepare": ensure_violations_fresh,
+        "properties": ["construction_id", "risk_factor", "hospital", "severity", "distance_m"],
+        "sql": f"""
+            SELECT construction_id, risk_factor, hospital, severity, distance_m, geom
+            FROM {VIOLATION_TABLE}
+        """,
+    },
+    "construction": {
+        "min_zoom": 8,
+        "tables": ["construction_projects"],
+        "properties": ["id", "name", "project_type", "risk_factor"],
+        "sql": """
+            SELECT id, name, project_type, risk_factor, geom
+            FROM construction_projects
+        """,
+    },
+}
+
+_cache = TieredCache(
+    "tiles",
+    TILE_CACHE_SIZE,
+    TILE_CACHE_TTL_S,
+    dumps=lambda tile: tile,
+    loads=lambda raw: raw
+)
+
+
+class UnknownLayer(Exception):
+    pass
+
+
+class InvalidTile(Exception):
+    pass
+
+
+def _render_tile(layer, z, x, y):
+    spec = LAYERS[layer]
+    if z < spec["min_zoom"]:
+        return b""
+
+    properties = "".join(f", src.{column}" for column in spec["properties"])
+
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(f"""
+            WITH bounds AS (
+              SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS env,
+                     ST_Transform(
+                       ST_TileEnvelope(%(z)s, %(x)s, %(y)s, margin => %(margin)s),
+                       4326
+                     ) AS env_4326
+            ),
+            src AS ({spec["sql"]}),
+            mvt AS (
+              SELECT
+                ST_AsMVTGeom(
+                  ST_Transform(src.geom, 3857), bounds.env, %(extent)s, %(buffer)s, true
+                ) AS mvt_geom
+                {properties}
+              FROM src, bounds
+              WHERE src.geom && bounds.env_4326
+            )
+            SELECT ST_AsMVT(mvt, %(layer)s, %(extent)s, 'mvt_geom')
+            FROM (SELECT * FROM mvt WHERE mvt_geom IS NOT NULL) mvt
+        """, {
+            "z": z,
+            "x": x,
+            "y": y,
+            "margin": TILE_BUFFER / TILE_EXTENT,
+            "extent": TILE_EXTENT,
+            "buffer": TILE_BUFFER,
+            "layer": layer,
+        })
+        row = cur.fetchone()
+
+    return bytes(row[0]) if row and row[0] is not None else b""
+
+
+def get_tile(layer, z, x, y):
+    """
+    Return (tile bytes, data version) for a layer tile, served from the
+    tile cache while the layer's tables are unchanged.
+    """
+    if layer not in LAYERS:
+        raise UnknownLayer(layer)
+    if not 0 <= z <= TILE_MAX_ZOOM or not (0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        raise InvalidTile(f"{z}/{x}/{y}")
+
+    spec = LAYERS[layer]
+    if "prepare" in spec:
+        spec["prepare"]()
+
+    version = data_version(spec["tables"])
+    key = (layer, TILE_FORMAT, version, z, x, y)
+
+    tile = _cache.get(key)
+    if tile is None:
+        tile = _render_tile(layer, z, x, y)
+        _cache.set(key, tile)
+    return tile, version
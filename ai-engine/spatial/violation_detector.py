@@ -1,32 +1,262 @@
 import json
 import os
-import psycopg2
-
-def detect_construction_hospital_violations():
-    conn = psycopg2.connect(
-    host=os.getenv("POSTGRES_HOST", "postgis"),
-    port=os.getenv("POSTGRES_PORT", 5432),
-    database=os.getenv("POSTGRES_DB", "citybrain"),
-    user=os.getenv("POSTGRES_USER", "postgres"),
-    password=os.getenv("POSTGRES_PASSWORD", "postgres")
-)
-    cur = conn.cursor()
-
-    query = """
+import threading
+import time
+
+from spatial.buffer_materializer import BUFFER_TABLE, ensure_hospital_buffers
+from spatial.geojson import feature_sql
+from spatial.postgis_client import pg_connection
+
+VIOLATION_TABLE = "construction_violations"
+VIOLATION_CHANGES = "violation_changes"
+
+# how often a read may check the change log
+VIOLATION_REFRESH_INTERVAL_S = float(os.getenv("VIOLATION_REFRESH_INTERVAL_S", 5))
+
+_REFRESH_LOCK_ID = 0x76696F6C  # "viol"
+
+_schema_ready = False
+_last_refresh = 0.0
+_lock = threading.Lock()
+
+
+def _ensure_schema(cur):
+    """
+    Results table, change log and the triggers feeding it. Returns True
+    when the results table had to be created, i.e. needs a full build.
+    """
+    cur.execute("SELECT to_regclass(%s) IS NULL", (VIOLATION_TABLE,))
+    created = cur.fetchone()[0]
+
+    # column types follow the source tables
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {VIOLATION_TABLE} AS
+        SELECT
+          c.id AS construction_id,
+          h.id AS hospital_id,
+          h.name AS hospital,
+          ''::text AS severity,
+          0 AS tier_m,
+          0::float8 AS distance_m,
+          c.risk_factor,
+          c.geom,
+          now() AS updated_at
+        FROM construction_projects c, hospitals h
+        WITH NO DATA;
+
+        CREATE UNIQUE INDEX IF NOT EXISTS {VIOLATION_TABLE}_key
+          ON {VIOLATION_TABLE} (construction_id, hospital_id);
+        CREATE INDEX IF NOT EXISTS {VIOLATION_TABLE}_hospital
+          ON {VIOLATION_TABLE} (hospital_id);
+        CREATE INDEX IF NOT EXISTS {VIOLATION_TABLE}_severity
+          ON {VIOLATION_TABLE} (severity);
+        CREATE INDEX IF NOT EXISTS {VIOLATION_TABLE}_geom
+          ON {VIOLATION_TABLE} USING GIST (geom);
+
+        CREATE TABLE IF NOT EXISTS {VIOLATION_CHANGES} AS
+        SELECT c.id AS construction_id, h.id AS hospital_id
+        FROM construction_projects c, hospitals h
+        WITH NO DATA;
+        ALTER TABLE {VIOLATION_CHANGES}
+          ADD COLUMN IF NOT EXISTS change_id BIGSERIAL,
+          ADD COLUMN IF NOT EXISTS logged_at TIMESTAMPTZ DEFAULT now();
+
+        CREATE OR REPLACE FUNCTION log_construction_change() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP <> 'INSERT' THEN
+            INSERT INTO {VIOLATION_CHANGES} (construction_id) VALUES (OLD.id);
+          END IF;
+          IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.id IS DISTINCT FROM OLD.id) THEN
+            INSERT INTO {VIOLATION_CHANGES} (construction_id) VALUES (NEW.id);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION log_hospital_buffer_change() RETURNS trigger AS $$
+        BEGIN
+          IF TG_OP <> 'INSERT' THEN
+            INSERT INTO {VIOLATION_CHANGES} (hospital_id) VALUES (OLD.hospital_id);
+          END IF;
+          IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.hospital_id IS DISTINCT FROM OLD.hospital_id) THEN
+            INSERT INTO {VIOLATION_CHANGES} (hospital_id) VALUES (NEW.hospital_id);
+          END IF;
+          RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS construction_violation_log ON construction_projects;
+        CREATE TRIGGER construction_violation_log
+          AFTER INSERT OR UPDATE OR DELETE ON construction_projects
+          FOR EACH ROW EXECUTE FUNCTION log_construction_change();
+
+        DROP TRIGGER IF EXISTS hospital_buffer_violation_log ON {BUFFER_TABLE};
+        CREATE TRIGGER hospital_buffer_violation_log
+          AFTER INSERT OR UPDATE OR DELETE ON {BUFFER_TABLE}
+          FOR EACH ROW EXECUTE FUNCTION log_hospital_buffer_change();
+    """)
+    return created
+
+
+def _insert_violations(cur, where):
+    # a project inside several tiers of one hospital keeps the innermost
+    cur.execute(f"""
+        INSERT INTO {VIOLATION_TABLE} AS v
+          (construction_id, hospital_id, hospital, severity, tier_m,
+           distance_m, risk_factor, geom, updated_at)
+        SELECT DISTINCT ON (c.id, h.id)
+          c.id,
+          h.id,
+          h.name,
+          b.buffer_type,
+          b.distance_m,
+          ROUND(ST_Distance(c.geom::geography, h.geom::geography)),
+          c.risk_factor,
+          c.geom,
+          now()
+        FROM construction_projects c
+        JOIN {BUFFER_TABLE} b ON ST_Intersects(c.geom, b.geom)
+        JOIN hospitals h ON h.id = b.hospital_id
+        {where}
+        ORDER BY c.id, h.id, b.distance_m
+        ON CONFLICT (construction_id, hospital_id) DO UPDATE SET
+          hospital = EXCLUDED.hospital,
+          severity = EXCLUDED.severity,
+          tier_m = EXCLUDED.tier_m,
+          distance_m = EXCLUDED.distance_m,
+          risk_factor = EXCLUDED.risk_factor,
+          geom = EXCLUDED.geom,
+          updated_at = EXCLUDED.updated_at
+    """)
+    return cur.rowcount
+
+
+def refresh_violations(full=False):
+    """
+    Apply pending construction/buffer changes to the violations table.
+    Only projects and hospitals named in the change log are re-joined;
+    the log rows are consumed in the same transaction, so changes that
+    commit meanwhile are picked up by the next refresh.
+    """
+    global _schema_ready, _last_refresh
+    ensure_hospital_buffers()
+
+    with pg_connection(statement_timeout_ms=0) as conn:
+        cur = conn.cursor()
+        # taken before the schema DDL too, so concurrent first refreshes
+        # do not race on the trigger functions
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (_REFRESH_LOCK_ID,))
+        if not _schema_ready:
+            full = _ensure_schema(cur) or full
+
+        if full:
+            cur.execute(f"TRUNCATE {VIOLATION_TABLE}, {VIOLATION_CHANGES}")
+            written = _insert_violations(cur, "")
+            removed = 0
+            dirty = None
+        else:
+            cur.execute(f"""
+                CREATE TEMP TABLE violation_dirty ON COMMIT DROP AS
+                SELECT construction_id, hospital_id FROM {VIOLATION_CHANGES}
+                WITH NO DATA;
+
+                WITH consumed AS (
+                  DELETE FROM {VIOLATION_CHANGES}
+                  RETURNING construction_id, hospital_id
+                )
+                INSERT INTO violation_dirty SELECT DISTINCT * FROM consumed;
+            """)
+            dirty = cur.rowcount
+            written = removed = 0
+
+            if dirty:
+                cur.execute(f"""
+                    DELETE FROM {VIOLATION_TABLE}
+                    WHERE construction_id IN (
+                      SELECT construction_id FROM violation_dirty WHERE construction_id IS NOT NULL
+                    )
+                    OR hospital_id IN (
+                      SELECT hospital_id FROM violation_dirty WHERE hospital_id IS NOT NULL
+                    )
+                """)
+                removed = cur.rowcount
+                # one pass, so a pair whose project and hospital both
+                # changed is written (and counted) once
+                written = _insert_violations(cur, """
+                    WHERE c.id IN (
+                      SELECT construction_id FROM violation_dirty WHERE construction_id IS NOT NULL
+                    )
+                    OR b.hospital_id IN (
+                      SELECT hospital_id FROM violation_dirty WHERE hospital_id IS NOT NULL
+                    )
+                """)
+
+        conn.commit()
+        cur.close()
+
+    _schema_ready = True
+    _last_refresh = time.monotonic()
+    if full or dirty:
+        print(f"Violations refreshed (full={full}): {removed} removed, {written} written")
+    return {"full": full, "changes": dirty, "removed": removed, "written": written}
+
+
+def ensure_violations_fresh():
+    """
+    Cheap check before reads: at most one refresh per interval, which is
+    a no-op when the change log is empty.
+    """
+    if time.monotonic() - _last_refresh < VIOLATION_REFRESH_INTERVAL_S:
+        return
+    with _lock:
+        if time.monotonic() - _last_refresh >= VIOLATION_REFRESH_INTERVAL_S:
+            refresh_violations()
+
+
+def _filters(bbox, severities):
+    filters = []
+    params = {}
+    if bbox is not None:
+        filters.append("geom && ST_MakeEnvelope(%(x1)s, %(y1)s, %(x2)s, %(y2)s, 4326)")
+        params.update(zip(("x1", "y1", "x2", "y2"), bbox))
+    if severities:
+        filters.append("severity = ANY(%(severities)s)")
+        params["severities"] = list(severities)
+    where = ("WHERE " + " AND ".join(filters)) if filters else ""
+    return where, params
+
+
+def detect_construction_hospital_violations(limit=1000, offset=0, bbox=None, severities=None):
+    """
+    Page of violations, worst tier first, optionally restricted to a
+    (min_lon, min_lat, max_lon, max_lat) bbox and severities. Returns
+    (violations, total matching).
+    """
+    ensure_violations_fresh()
+
+    where, params = _filters(bbox, severities)
+    params.update(limit=limit, offset=offset)
+
+    query = f"""
     SELECT
-      c.id,
-      c.risk_factor,
-      h.name,
-      b.buffer_type,
-      ST_AsGeoJSON(c.geom),
-      ROUND(ST_Distance(c.geom::geography, h.geom::geography)) AS distance
-    FROM construction_projects c
-    JOIN hospital_buffers b ON ST_Intersects(c.geom, b.geom)
-    JOIN hospitals h ON h.id = b.hospital_id
+      construction_id,
+      risk_factor,
+      hospital,
+      severity,
+      ST_AsGeoJSON(geom),
+      distance_m
+    FROM {VIOLATION_TABLE}
+    {where}
+    ORDER BY tier_m, distance_m, construction_id, hospital_id
+    LIMIT %(limit)s OFFSET %(offset)s
     """
 
-    cur.execute(query)
-    rows = cur.fetchall()
+    with pg_connection() as conn, conn.cursor() as cur:
+        cur.execute(query, params)
+        rows = cur.fetchall()
+        # counted separately so a page past the end still reports it
+        cur.execute(f"SELECT COUNT(*) FROM {VIOLATION_TABLE} {where}", params)
+        total = cur.fetchone()[0]
 
     violations = []
     for r in rows:
@@ -39,6 +269,27 @@ def detect_construction_hospital_violations():
             "geometry": json.loads(r[4]),
         })
 
-    cur.close()
-    conn.close()
-    return violations
+    return violations, total
+
+
+def violation_features_sql(bbox=None, severities=None):
+    """
+    (sql, params) producing one serialized Feature per violation, for
+    stream_features.
+    """
+    ensure_violations_fresh()
+
+    where, params = _filters(bbox, severities)
+    feature = feature_sql("ST_AsGeoJSON(geom)", {
+        "construction_id": "construction_id",
+        "hospital": "hospital",
+        "severity": "severity",
+        "distance_m": "distance_m",
+        "risk_factor": "risk_factor",
+    })
+    return f"""
+    SELECT {feature}
+    FROM {VIOLATION_TABLE}
+    {where}
+    ORDER BY tier_m, distance_m, construction_id, hospital_id
+    """, params
@@ -107,18 +107,13 @@ app.get("/api/impact/summary/:roadId", async (req, res) => {
 app.get("/api/nearest-road", async (req, res) => {
   const { lat, lng } = req.query;
 
-  const query = `
-    SELECT osm_id
-    FROM planet_osm_roads
-    ORDER BY way <-> ST_SetSRID(ST_Point($1, $2), 4326)
-    LIMIT 1;
-  `;
-
   try {
-    const result = await pool.query(query, [lng, lat]);
-    res.json({ road_id: result.rows[0].osm_id });
+    const r = await fetch(
+      `https://citybrain.onrender.com/api/nearest-road?lat=${lat}&lng=${lng}`
+    );
+    res.status(r.status).json(await r.json());
   } catch (e) {
-    res.status(500).json({ error: e.message });
+    res.status(500).json({ error: "Nearest road service unavailable" });
   }
 });
 